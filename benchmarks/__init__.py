@@ -0,0 +1 @@
+# benchmarks package (run from the project root, e.g. `python -m benchmarks.cc_cleanup`)
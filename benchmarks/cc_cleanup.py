@@ -0,0 +1,66 @@
+# benchmarks/cc_cleanup.py
+"""
+Compares the per-component cleanup loop with the vectorized
+`remove_small_components` as the number of connected components grows.
+
+Usage: python -m benchmarks.cc_cleanup [--width 640] [--height 480] [--repeat 20]
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from utils.vision_processing.detector import remove_small_components
+
+MIN_AREA = 300
+
+
+def legacy_cleanup(mask, min_area):
+    """The original loop: one full label-image scan per component."""
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    cleaned_mask = np.zeros_like(mask)
+    for i in range(1, num_labels):
+        if stats[i, cv2.CC_STAT_AREA] >= min_area:
+            cleaned_mask[labels == i] = 255
+    return cleaned_mask
+
+
+def make_mask(width, height, components, rng):
+    """Random mask with roughly `components` blobs of mixed sizes (some above MIN_AREA)."""
+    mask = np.zeros((height, width), np.uint8)
+    for _ in range(components):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        r = int(rng.choice([2, 4, 14]))
+        cv2.circle(mask, (x, y), r, 255, -1)
+    return mask
+
+
+def time_it(fn, mask, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(mask, MIN_AREA)
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connected-components cleanup microbenchmark")
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'components':>10} {'loop ms':>10} {'vector ms':>10} {'speedup':>8}")
+    for count in (1, 10, 50, 100, 250, 500, 1000, 2000):
+        mask = make_mask(args.width, args.height, count, rng)
+        num_labels = cv2.connectedComponents(mask, connectivity=8)[0] - 1
+        assert np.array_equal(legacy_cleanup(mask, MIN_AREA), remove_small_components(mask, MIN_AREA))
+        loop_ms = time_it(legacy_cleanup, mask, args.repeat)
+        vec_ms = time_it(remove_small_components, mask, args.repeat)
+        print(f"{num_labels:>10} {loop_ms:>10.2f} {vec_ms:>10.2f} {loop_ms / vec_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
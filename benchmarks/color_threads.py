@@ -0,0 +1,106 @@
+# benchmarks/color_threads.py
+"""
+Scaling of the per-color thread pool (detector.set_color_threads) by color
+count and thread count, on synthetic scenes with up to 6 configured colors.
+
+For every (colors, threads) pair the full find_targets path is timed and the
+detections are checked against the serial run. Speedup is relative to the
+serial run with the same number of colors. The pool only helps when there are
+free cores; run it on the target (e.g. a 4-core Pi 4), with OpenCV's own
+threading limited via --cv_threads so the two do not compete.
+
+Usage: python -m benchmarks.color_threads [--width 1280] [--height 720] [--scenes 30] [--cv_threads 1]
+"""
+
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from utils.vision_processing.compiled_config import CompiledColorConfig
+from utils.vision_processing.config import min_component_area
+from utils.vision_processing.detector import find_targets, set_color_threads
+from utils.vision_processing.contour_features import MIN_CONTOUR_AREA
+
+# Non-overlapping hue bands, so every added color brings its own targets
+BENCH_HUES = {"Red": 170, "Orange": 14, "Yellow": 28, "Green": 60, "Cyan": 88, "Blue": 115}
+HUE_HALF_WIDTH = 5
+
+
+def color_config(names):
+    ranges = {name: [[BENCH_HUES[name] - HUE_HALF_WIDTH, 100, 100], [BENCH_HUES[name] + HUE_HALF_WIDTH, 255, 255]] for name in names}
+    actions = {}
+    for i, name in enumerate(names):
+        actions[(name, "Triangle")] = f"{name[0]}T{i}"
+        actions[(name, "Square")] = f"{name[0]}S{i}"
+    return CompiledColorConfig(ranges, actions, min_component_area)
+
+
+def make_scene(width, height, rng):
+    """Two targets per color plus speckle noise in every color."""
+    frame = np.full((height, width, 3), 70, np.uint8)
+    frame = cv2.add(frame, rng.integers(0, 25, (height, width, 3), dtype=np.uint8))
+    for hue in BENCH_HUES.values():
+        bgr = tuple(int(c) for c in cv2.cvtColor(np.uint8([[[hue, 210, 210]]]), cv2.COLOR_HSV2BGR)[0, 0])
+        for _ in range(2):
+            size = int(rng.integers(int(MIN_CONTOUR_AREA ** 0.5) + 20, 120))
+            x = int(rng.integers(0, width - size))
+            y = int(rng.integers(0, height - size))
+            if rng.random() < 0.5:
+                cv2.rectangle(frame, (x, y), (x + size, y + size), bgr, -1)
+            else:
+                points = np.array([[x, y + size], [x + size, y + size], [x + size // 2, y]], np.int32)
+                cv2.fillPoly(frame, [points], bgr)
+        for _ in range(15):
+            cv2.circle(frame, (int(rng.integers(0, width)), int(rng.integers(0, height))), int(rng.integers(1, 4)), bgr, -1)
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-color thread pool scaling benchmark")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--scenes', type=int, default=30)
+    parser.add_argument('--cv_threads', type=int, default=1, help="cv2.setNumThreads value during the run")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--colors', type=int, nargs='+', default=[1, 2, 3, 4, 6])
+    args = parser.parse_args()
+
+    cv2.setNumThreads(args.cv_threads)
+    cores = os.cpu_count()
+    print(f"CPU cores: {cores}, OpenCV threads: {cv2.getNumThreads()}")
+    if cores is not None and cores < max(args.threads):
+        print(f"Warning: fewer cores than threads; the pool cannot scale past {cores}.")
+
+    rng = np.random.default_rng(0)
+    scenes = [make_scene(args.width, args.height, rng) for _ in range(args.scenes)]
+    names = list(BENCH_HUES)
+
+    print(f"{'colors':>6} {'threads':>7} {'median ms':>10} {'mean ms':>8} {'speedup':>8} {'same':>5}")
+    for count in args.colors:
+        config = color_config(names[:count])
+        baseline = None
+        reference = None
+        for threads in args.threads:
+            set_color_threads(threads)
+            find_targets(scenes[0], config)  # 預熱（查找表編譯、執行緒建立）
+            times, results = [], []
+            for frame in scenes:
+                start = time.perf_counter()
+                detections, _ = find_targets(frame, config)
+                times.append((time.perf_counter() - start) * 1000.0)
+                results.append(detections)
+            median = float(np.median(times))
+            if reference is None:
+                baseline, reference = median, results
+            print(
+                f"{count:>6} {threads:>7} {median:>10.2f} {np.mean(times):>8.2f}"
+                f" {baseline / median:>7.2f}x {str(results == reference):>5}"
+            )
+    set_color_threads(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/pusher_pixfmt.py
+"""
+Compares CPU usage of RTSPPusher pixel formats (bgr24 / yuv420p / nv12).
+
+Frames are encoded exactly as in production but FFmpeg writes to the null
+muxer, so no RTSP server is needed. Reported per format: Python-side CPU
+(resize/convert/write), FFmpeg CPU, wall time and bytes sent over the pipe.
+
+Usage: python -m benchmarks.pusher_pixfmt [--width 1920] [--height 1080] [--frames 300]
+"""
+
+import argparse
+import resource
+import time
+
+import numpy as np
+
+from utils.stream_pusher.rtsp_pusher import RTSPPusher, PIXEL_FORMATS
+
+
+class NullOutputPusher(RTSPPusher):
+    """RTSPPusher that encodes to FFmpeg's null muxer instead of an RTSP server."""
+
+    def _output_args(self):
+        return ['-f', 'null', '-']
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_format(pixel_format, frames, width, height, fps):
+    rng = np.random.default_rng(0)
+    # A few distinct frames so the encoder does real work
+    source = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(4)]
+    pusher = NullOutputPusher("null", width=width, height=height, fps=fps, pixel_format=pixel_format)
+    if pusher.process is None:
+        return None
+    child_start = children_cpu()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for i in range(frames):
+        pusher.push_frame(source[i % len(source)])
+    python_cpu = time.process_time() - cpu_start
+    pusher.release()  # waits for FFmpeg to finish so its CPU time is accounted
+    wall = time.perf_counter() - wall_start
+    ffmpeg_cpu = children_cpu() - child_start
+    frame_bytes = pusher._convert_frame(source[0]).nbytes
+    return python_cpu, ffmpeg_cpu, wall, frame_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RTSPPusher pixel format benchmark")
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    results = {}
+    for pixel_format in PIXEL_FORMATS:
+        result = run_format(pixel_format, args.frames, args.width, args.height, args.fps)
+        if result is None:
+            print("FFmpeg could not be started; is it installed and in PATH?")
+            return
+        results[pixel_format] = result
+
+    print(f"\n{args.frames} frames at {args.width}x{args.height}")
+    print(f"{'format':>8} {'py cpu s':>9} {'ffmpeg cpu s':>13} {'wall s':>8} {'bytes/frame':>12}")
+    for pixel_format, (python_cpu, ffmpeg_cpu, wall, frame_bytes) in results.items():
+        print(f"{pixel_format:>8} {python_cpu:>9.2f} {ffmpeg_cpu:>13.2f} {wall:>8.2f} {frame_bytes:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# benchmarks/pyramid_detect.py
+"""
+Accuracy/latency comparison of the full-resolution detect_target path with the
+coarse-to-fine pyramid mode (pyramid=2 and 4) on synthetic conveyor scenes.
+
+Each scene has 1-3 colored squares/triangles of known label and box plus
+small color noise. Reported per mode: median/mean latency, recall/precision
+against the ground truth, mean box IoU of matched targets, how often the
+ordered label list (whose first entry drives the arm) agrees exactly with the
+full-resolution path, and how often the returned masks are identical to it.
+Masks are expected to differ in pyramid mode: they are zero outside the
+refined candidate boxes, and small blobs missed at low resolution are absent.
+
+Usage: python -m benchmarks.pyramid_detect [--width 1280] [--height 720] [--scenes 60]
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from utils.vision_processing.config import DEFAULT_COLOR_RANGES, action_map
+from utils.vision_processing.detector import detect_target, find_targets, pyramid_candidates
+
+# HSV hue in the middle of each default range
+SCENE_HUES = {"Red": 160, "Blue": 120, "Green": 60}
+
+
+def hsv_to_bgr(h, s, v):
+    pixel = np.uint8([[[h, s, v]]])
+    return tuple(int(c) for c in cv2.cvtColor(pixel, cv2.COLOR_HSV2BGR)[0, 0])
+
+
+def make_scene(width, height, rng):
+    """Returns (frame, [(label, (x, y, w, h))]) with non-overlapping targets."""
+    frame = np.full((height, width, 3), 70, np.uint8)
+    frame = cv2.add(frame, rng.integers(0, 25, (height, width, 3), dtype=np.uint8))
+    truth = []
+    occupied = []
+    for _ in range(int(rng.integers(1, 4))):
+        color = str(rng.choice(list(SCENE_HUES)))
+        shape = str(rng.choice(["Square", "Triangle"]))
+        size = int(rng.integers(70, 200))
+        for _attempt in range(20):
+            x = int(rng.integers(20, width - size - 20))
+            y = int(rng.integers(20, height - size - 20))
+            if all(x + size < ox or ox + os_ < x or y + size < oy or oy + os_ < y for ox, oy, os_ in occupied):
+                break
+        else:
+            continue
+        occupied.append((x - 20, y - 20, size + 40))
+        bgr = hsv_to_bgr(SCENE_HUES[color], 210, 210)
+        if shape == "Square":
+            cv2.rectangle(frame, (x, y), (x + size, y + size), bgr, -1)
+        else:
+            points = np.array([[x, y + size], [x + size, y + size], [x + size // 2, y]], np.int32)
+            cv2.fillPoly(frame, [points], bgr)
+        truth.append((action_map[(color, shape)], (x, y, size + 1, size + 1)))
+    # color speckles that the cleanup has to remove
+    for _ in range(40):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        bgr = hsv_to_bgr(SCENE_HUES[str(rng.choice(list(SCENE_HUES)))], 210, 210)
+        cv2.circle(frame, (x, y), int(rng.integers(1, 4)), bgr, -1)
+    return frame, truth
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def match(truth, detections):
+    """Greedy label + IoU matching; returns (matched, ious)."""
+    ious = []
+    remaining = list(detections)
+    for label, box in truth:
+        best = None
+        for det in remaining:
+            if det[0] == label and iou(det[1], box) > 0.3 and (best is None or iou(det[1], box) > iou(best[1], box)):
+                best = det
+        if best is not None:
+            remaining.remove(best)
+            ious.append(iou(best[1], box))
+    return len(ious), ious
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pyramid vs full-resolution detect_target benchmark")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--scenes', type=int, default=60)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    scenes = [make_scene(args.width, args.height, rng) for _ in range(args.scenes)]
+
+    print(f"{'mode':>6} {'median ms':>10} {'mean ms':>8} {'recall':>7} {'precision':>9} {'mean IoU':>9} {'same labels':>11} {'same masks':>10}")
+    reference = reference_masks = None
+    for factor in (1, 2, 4):
+        times, labels_per_scene, masks_per_scene = [], [], []
+        matched = truth_total = detected_total = 0
+        all_ious = []
+        for frame, truth in scenes:
+            start = time.perf_counter()
+            rois = pyramid_candidates(frame, DEFAULT_COLOR_RANGES, factor) if factor > 1 else None
+            detections, masks = find_targets(frame, DEFAULT_COLOR_RANGES, rois)
+            times.append((time.perf_counter() - start) * 1000.0)
+            found = [(det.label, det.box) for det in detections]
+            count, ious = match(truth, found)
+            matched += count
+            truth_total += len(truth)
+            detected_total += len(found)
+            all_ious.extend(ious)
+            labels_per_scene.append([det.label for det in detections])  # 保留順序：第一個標籤決定動作
+            masks_per_scene.append(masks)
+        if reference is None:
+            reference, reference_masks = labels_per_scene, masks_per_scene
+        agree = sum(a == b for a, b in zip(reference, labels_per_scene)) / len(scenes)
+        same_masks = sum(
+            all(np.array_equal(a[name], b[name]) for name in a) for a, b in zip(reference_masks, masks_per_scene)
+        ) / len(scenes)
+        print(
+            f"{'x' + str(factor):>6} {np.median(times):>10.2f} {np.mean(times):>8.2f}"
+            f" {matched / max(1, truth_total):>7.3f} {matched / max(1, detected_total):>9.3f}"
+            f" {np.mean(all_ious) if all_ious else 0.0:>9.3f} {agree:>11.1%} {same_masks:>10.1%}"
+        )
+
+    # detect_target itself (incl. annotation) keeps the same return contract in every mode
+    frame, _ = scenes[0]
+    for factor in (1, 2, 4):
+        result = detect_target(frame, DEFAULT_COLOR_RANGES, pyramid=factor)
+        assert len(result) == 4 and set(result[2]) == set(DEFAULT_COLOR_RANGES)
+
+
+if __name__ == '__main__':
+    main()
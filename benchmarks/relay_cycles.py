@@ -0,0 +1,71 @@
+# benchmarks/relay_cycles.py
+"""
+Simulates thousands of pick cycles of PiGPIOController in virtual time
+(utils.clock.SimulatedClock) and compares the timed and ack relay protocols.
+
+The simulated device acknowledges `--ack_latency` seconds after R1 rises by
+toggling the ready/ack pin. No GPIO or real waiting is involved, so the run
+takes milliseconds of wall time per thousand cycles.
+
+Usage: python -m benchmarks.relay_cycles [--cycles 2000] [--ack_latency 0.15]
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+from utils.arm_controller.pi_gpio_controller import PiGPIOController
+from utils.clock import SimulatedClock
+
+
+class SimulatedDeviceController(PiGPIOController):
+    """Controller whose simulated downstream device acks each R1 activation."""
+
+    def __init__(self, ack_latency, **kwargs):
+        super().__init__(relay_pins=[0, 0, 0, 0], ready_pin=26, **kwargs)
+        self.ack_latency = ack_latency
+
+    def _set_relay_state(self, relay_index, state):
+        super()._set_relay_state(relay_index, state)
+        if relay_index == 0 and state:
+            level = self.get_ready_pin()
+            self.clock.schedule(self.ack_latency, lambda: self.set_ready_pin_sim(not level))
+
+
+def run(protocol_mode, cycles, ack_latency):
+    clock = SimulatedClock()
+    controller = SimulatedDeviceController(ack_latency, protocol_mode=protocol_mode, clock=clock,
+                                           command_queue_size=cycles)
+    triggers = (controller.trigger_action_A, controller.trigger_action_B)
+    wall_start = time.perf_counter()
+    for i in range(cycles):
+        # Alternate codes so consecutive commands are never coalesced
+        triggers[i % 2]()
+        controller.wait_idle()
+    wall = time.perf_counter() - wall_start
+    stats = controller.get_cycle_stats()
+    controller.cleanup()
+    return stats, clock.time(), wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay protocol throughput simulation")
+    parser.add_argument('--cycles', type=int, default=2000)
+    parser.add_argument('--ack_latency', type=float, default=0.15)
+    args = parser.parse_args()
+
+    results = {}
+    for protocol_mode in ("timed", "ack"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[protocol_mode] = run(protocol_mode, args.cycles, args.ack_latency)
+
+    print(f"{args.cycles} simulated cycles, device ack latency {args.ack_latency * 1000:.0f} ms")
+    print(f"{'protocol':>8} {'mean cycle s':>13} {'picks/min':>10} {'acked':>6} {'virtual s':>10} {'wall s':>7}")
+    for protocol_mode, (stats, virtual_seconds, wall) in results.items():
+        print(f"{protocol_mode:>8} {stats['mean']:>13.3f} {stats['picks_per_minute']:>10.1f} "
+              f"{stats['acked']:>6} {virtual_seconds:>10.0f} {wall:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
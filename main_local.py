@@ -3,19 +3,24 @@ import argparse
 import numpy as np
 import time
 from copy import deepcopy
-from PIL import ImageFont
-from collections import Counter
 
 from utils.app_core import (
     add_common_arguments, 
     initialize_camera, 
     initialize_arm_controller, 
+    initialize_motion_gate,
+    initialize_tracker,
+    initialize_color_threads,
     process_frame_and_control_arm,
     cleanup_resources,
     StateManager 
 )
 from utils.vision_processing import config as vision_config
-from utils.vision_processing.ui_basic import draw_chinese_text
+from utils.clock import system_clock
+from utils.vision_processing.vote_engine import SequentialVoter
+from utils.vision_processing.ui_basic import draw_chinese_text, get_font
+from utils.vision_processing.work_zone import WorkZone
+from utils.vision_processing.compiled_config import ColorConfigHolder
 
 # --- 全域變數 ---
 CANVAS_H = 900
@@ -24,10 +29,17 @@ current_color_to_adjust = "Red"
 current_action_from_buttons = None
 live_color_ranges = {}
 hsv_values = [[0,0,0],[179,255,255]]
+hsv_dirty = True  # hsv_values 已修改、尚未編譯進 color_config
+# 偵測用的已編譯顏色設定；只有 HSV 改變時才重新編譯並整個替換
+color_config = ColorConfigHolder(vision_config.action_map, lambda: vision_config.min_component_area)
 dragging = None  # (idx, min_or_max) or None
 ui_enabled = True  # 預設開啟UI
 hovered_button_idx = None  # 新增：目前 hover 的按鈕編號
 save_feedback_end_time = 0 # 新增：用來控制儲存成功訊息的顯示時間
+pending_save_token = None  # 最後一次「儲存設定」的背景寫入 token，寫入完成前為非 None
+work_zone = None  # 工作區（WorkZone，None=整張畫面），與 color_config.json 一起儲存
+zone_drag = None  # 拖曳中的工作區 [x0, y0, x1, y1]（0~1 正規化座標）
+work_zone_changed = False
 
 # --- UI 參數 ---
 BUTTON_HEIGHT = 30
@@ -87,7 +99,7 @@ def draw_buttons_panel_img(current_color, panel_w=320, panel_h=None):
     font_size = 28
     font_path = "chinese.ttf"
     # 先用 PIL 計算文字寬度
-    font = ImageFont.truetype(font_path, font_size)
+    font = get_font(font_path, font_size)
     bbox = font.getbbox(adjust_text)
     text_w, text_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
     text_x = (panel_w - text_w) // 2
@@ -107,7 +119,7 @@ def draw_buttons_panel_img(current_color, panel_w=320, panel_h=None):
         cv2.rectangle(panel, (btn_x, y), (btn_x + btn_w, y + btn_h), color, -1)
         # 置中計算
         font_size_btn = 22
-        font_btn = ImageFont.truetype(font_path, font_size_btn)
+        font_btn = get_font(font_path, font_size_btn)
         bbox_btn = font_btn.getbbox(button["text"])
         text_w_btn, text_h_btn = bbox_btn[2] - bbox_btn[0], bbox_btn[3] - bbox_btn[1]
         text_x_btn = btn_x + (btn_w - text_w_btn) // 2
@@ -122,92 +134,168 @@ def draw_buttons_panel_img(current_color, panel_w=320, panel_h=None):
         )
     return panel
 
-def draw_combined_ui(main_img, hsv_values, current_color, mask=None, label_counter=None):
-    canvas_h, canvas_w = CANVAS_H, CANVAS_W
-    canvas = np.full((canvas_h, canvas_w, 3), 255, dtype=np.uint8)  # 背景白色
-
-    # 相對位置與大小
-    main_x = int(canvas_w * 0.015)
-    main_y = int(canvas_h * 0.028)
-    main_w = int(canvas_w * 0.7)
-    main_h = int(canvas_h * 0.47)
+class CombinedUICompositor:
+    """
+    Retained-mode renderer for the ALL-IN-ONE canvas.
+    Static labels and panel backgrounds are rendered once; each frame only the
+    camera/mask regions are blitted, while the HSV bars and the button panel
+    are redrawn only when their inputs change.
+    """
+
+    def __init__(self, canvas_w=CANVAS_W, canvas_h=CANVAS_H):
+        self.canvas_w, self.canvas_h = canvas_w, canvas_h
+        # 相對位置與大小
+        self.main_x = int(canvas_w * 0.015)
+        self.main_y = int(canvas_h * 0.028)
+        self.main_w = int(canvas_w * 0.7)
+        self.main_h = int(canvas_h * 0.47)
+
+        self.mask_x = self.main_x
+        self.mask_y = self.main_y + self.main_h + int(canvas_h * 0.02)
+        self.mask_w = self.main_w
+        self.mask_h = self.main_h
+
+        self.hsv_panel_x = int(canvas_w * 0.75)
+        self.hsv_panel_y = int(canvas_h * 0.08)  # 互動區一致
+        self.hsv_panel_w = int(canvas_w * 0.22)
+        self.hsv_panel_h = int(canvas_h * 0.25)
+
+        self.ctrl_panel_x = self.hsv_panel_x
+        self.ctrl_panel_y = int(canvas_h * 0.40)  # 原本是 0.48，往上移一點
+
+        self.background = None
+        self.canvas = None
+        self._hsv_key = None
+        self._panel_key = None
+        self._panel_cache = {}
+
+    def _build_background(self):
+        canvas = np.full((self.canvas_h, self.canvas_w, 3), 255, dtype=np.uint8)  # 背景白色
+        # 右上HSV panel
+        # 將 "HSV調整" 文字往上提 15px
+        canvas = draw_chinese_text(canvas, "HSV調整", (self.hsv_panel_x, self.hsv_panel_y - 15), font_size=28, color=(0,0,0))
+        cv2.rectangle(canvas, (self.hsv_panel_x, self.hsv_panel_y+10), (self.hsv_panel_x+self.hsv_panel_w, self.hsv_panel_y+10+self.hsv_panel_h), (220,220,220), -1)  # 淡灰
+        # 右下Control panel（面板本體由 _draw_button_panel 貼上）
+        btn_count = len(buttons_config)
+        ctrl_h = 50 + btn_count * 40 + (btn_count - 1) * 15 + 20  # 與 draw_buttons_panel_img 一致
+        cv2.rectangle(canvas, (self.ctrl_panel_x, self.ctrl_panel_y), (self.ctrl_panel_x+self.hsv_panel_w, self.ctrl_panel_y+ctrl_h), (220,220,220), -1)
+        canvas = draw_chinese_text(canvas, "控制面板", (self.ctrl_panel_x, self.ctrl_panel_y - 35), font_size=28, color=(0,0,0))
+        self.background = canvas
+        self.canvas = canvas.copy()
+
+    def _restore(self, x, y, w, h):
+        self.canvas[y:y+h, x:x+w] = self.background[y:y+h, x:x+w]
+
+    def _draw_hsv_bars(self, hsv_values):
+        canvas = self.canvas
+        self._restore(self.hsv_panel_x, self.hsv_panel_y+10, self.hsv_panel_w+1, self.hsv_panel_h+1)
+        labels = ["H", "S", "V"]
+        maxs = [179, 255, 255]
+        bar_x = self.hsv_panel_x + int(self.hsv_panel_w * 0.07)
+        bar_w = int(self.hsv_panel_w * 0.8)
+        bar_h = int(self.hsv_panel_h * 0.13)
+        for i, l in enumerate(labels):
+            y = self.hsv_panel_y + 40 + i*int(self.hsv_panel_h * 0.28)
+            cv2.rectangle(canvas, (bar_x, y), (bar_x+bar_w, y+bar_h), (180,180,180), -1)  # 更淡灰
+            vmin = int(hsv_values[0][i]/maxs[i]*bar_w)
+            vmax = int(hsv_values[1][i]/maxs[i]*bar_w)
+            cv2.rectangle(canvas, (bar_x+vmin, y), (bar_x+vmax, y+bar_h), (0,0,0), -1)  # 黑色區間
+            cv2.rectangle(canvas, (bar_x+vmin-5, y-5), (bar_x+vmin+5, y+bar_h+5), (50,50,50), -1)  # 深灰滑塊
+            cv2.rectangle(canvas, (bar_x+vmax-5, y-5), (bar_x+vmax+5, y+bar_h+5), (100,100,100), -1)  # 深灰滑塊
+            cv2.putText(canvas, f"{l}_min:{hsv_values[0][i]:3d}", (bar_x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,0,0), 1)
+            cv2.putText(canvas, f"{l}_max:{hsv_values[1][i]:3d}", (bar_x+int(bar_w*0.6), y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,0,0), 1)
+
+    def _draw_button_panel(self, current_color):
+        # 依 (顏色, hover, 儲存提示) 快取面板影像
+        key = (current_color, hovered_button_idx, time.time() < save_feedback_end_time)
+        if key == self._panel_key:
+            return
+        ctrl_panel = self._panel_cache.get(key)
+        if ctrl_panel is None:
+            ctrl_panel = draw_buttons_panel_img(current_color, panel_w=self.hsv_panel_w)
+            self._panel_cache[key] = ctrl_panel
+        ctrl_h, ctrl_w = ctrl_panel.shape[:2]
+        # 修正：確保不超出 canvas
+        y1 = int(self.ctrl_panel_y)
+        y2 = min(y1 + ctrl_h, self.canvas.shape[0])
+        x1 = int(self.ctrl_panel_x)
+        x2 = min(x1 + ctrl_w, self.canvas.shape[1])
+        self.canvas[y1:y2, x1:x2] = ctrl_panel[:y2-y1, :x2-x1]
+        self._panel_key = key
+
+    def render(self, main_img, hsv_values, current_color, mask=None, label_counter=None, work_zone_rect=None):
+        if self.background is None:
+            self._build_background()
+        canvas = self.canvas
+
+        # 左上主畫面
+        main_img_resized = cv2.resize(main_img, (self.main_w, self.main_h))
+        if work_zone_rect is not None:
+            # 工作區框線畫在縮放後的主畫面上，不會殘留在背景
+            zx0, zy0, zx1, zy1 = work_zone_rect
+            cv2.rectangle(
+                main_img_resized,
+                (int(zx0 * (self.main_w - 1)), int(zy0 * (self.main_h - 1))),
+                (int(zx1 * (self.main_w - 1)), int(zy1 * (self.main_h - 1))),
+                (0, 255, 255), 2
+            )
+        canvas[self.main_y:self.main_y+self.main_h, self.main_x:self.main_x+self.main_w] = main_img_resized
+        draw_chinese_text(canvas, "攝影機", (self.main_x+10, self.main_y+10), font_size=32, color=(255,255,255))
+
+        # 左下mask
+        if mask is not None:
+            mask_color = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) if len(mask.shape)==2 else mask
+            mask_resized = cv2.resize(mask_color, (self.mask_w, self.mask_h))
+            canvas[self.mask_y:self.mask_y+self.mask_h, self.mask_x:self.mask_x+self.mask_w] = mask_resized
+            draw_chinese_text(canvas, "遮罩", (self.mask_x+10, self.mask_y+15), font_size=32, color=(255,255,255))
+        else:
+            self._restore(self.mask_x, self.mask_y, self.mask_w, self.mask_h)
+
+        # HSV 條只在數值改變時重畫
+        hsv_key = tuple(tuple(v) for v in hsv_values)
+        if hsv_key != self._hsv_key:
+            self._draw_hsv_bars(hsv_values)
+            self._hsv_key = hsv_key
+
+        self._draw_button_panel(current_color)
+
+        # 顯示計數器內容（左上角）
+        if label_counter is not None and len(label_counter) > 0:
+            counter_text = "計數器："
+            x_base = 30
+            y_base = 110  # 往下移動一點（原本是60）
+            draw_chinese_text(canvas, counter_text, (x_base, y_base), font_size=28, color=(0,0,255))
+            for i, (label, count) in enumerate(label_counter.most_common()):
+                text = f"{label}: {count}"
+                draw_chinese_text(canvas, text, (x_base, y_base + 35 + i*32), font_size=26, color=(0,0,180))
+
+        # 顯示模式
+        # mode_text = f"模式：{'一般' if current_mode == MODE_AUTO else '模擬'}"
+        # canvas = draw_chinese_text(canvas, mode_text, (30, 70), font_size=28, color=(0,128,255))
+
+        return canvas
+
+_compositor = CombinedUICompositor()
 
-    mask_x = main_x
-    mask_y = main_y + main_h + int(canvas_h * 0.02)
-    mask_w = main_w
-    mask_h = main_h
-
-    hsv_panel_x = int(canvas_w * 0.75)
-    hsv_panel_y = int(canvas_h * 0.08)  # 互動區一致
-    hsv_panel_w = int(canvas_w * 0.22)
-    hsv_panel_h = int(canvas_h * 0.25)
-
-    ctrl_panel_x = hsv_panel_x
-    ctrl_panel_y = int(canvas_h * 0.40)  # 原本是 0.48，往上移一點
-
-    # 左上主畫面
-    main_img_resized = cv2.resize(main_img, (main_w, main_h))
-    canvas[main_y:main_y+main_h, main_x:main_x+main_w] = main_img_resized
-    canvas = draw_chinese_text(canvas, "攝影機", (main_x+10, main_y+10), font_size=32, color=(255,255,255))
-
-    # 左下mask
-    if mask is not None:
-        mask_color = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) if len(mask.shape)==2 else mask
-        mask_resized = cv2.resize(mask_color, (mask_w, mask_h))
-        canvas[mask_y:mask_y+mask_h, mask_x:mask_x+mask_w] = mask_resized
-        canvas = draw_chinese_text(canvas, "遮罩", (mask_x+10, mask_y+15), font_size=32, color=(255,255,255))
-
-    # 右上HSV panel
-    # 將 "HSV調整" 文字往上提 15px
-    canvas = draw_chinese_text(canvas, "HSV調整", (hsv_panel_x, hsv_panel_y - 15), font_size=28, color=(0,0,0))
-    cv2.rectangle(canvas, (hsv_panel_x, hsv_panel_y+10), (hsv_panel_x+hsv_panel_w, hsv_panel_y+10+hsv_panel_h), (220,220,220), -1)  # 淡灰
-    labels = ["H", "S", "V"]
-    maxs = [179, 255, 255]
-    bar_x = hsv_panel_x + int(hsv_panel_w * 0.07)
-    bar_w = int(hsv_panel_w * 0.8)
-    bar_h = int(hsv_panel_h * 0.13)
-    for i, l in enumerate(labels):
-        y = hsv_panel_y + 40 + i*int(hsv_panel_h * 0.28)
-        cv2.rectangle(canvas, (bar_x, y), (bar_x+bar_w, y+bar_h), (180,180,180), -1)  # 更淡灰
-        vmin = int(hsv_values[0][i]/maxs[i]*bar_w)
-        vmax = int(hsv_values[1][i]/maxs[i]*bar_w)
-        cv2.rectangle(canvas, (bar_x+vmin, y), (bar_x+vmax, y+bar_h), (0,0,0), -1)  # 黑色區間
-        cv2.rectangle(canvas, (bar_x+vmin-5, y-5), (bar_x+vmin+5, y+bar_h+5), (50,50,50), -1)  # 深灰滑塊
-        cv2.rectangle(canvas, (bar_x+vmax-5, y-5), (bar_x+vmax+5, y+bar_h+5), (100,100,100), -1)  # 深灰滑塊
-        cv2.putText(canvas, f"{l}_min:{hsv_values[0][i]:3d}", (bar_x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,0,0), 1)
-        cv2.putText(canvas, f"{l}_max:{hsv_values[1][i]:3d}", (bar_x+int(bar_w*0.6), y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,0,0), 1)
-
-    # 右下Control panel
-    ctrl_panel = draw_buttons_panel_img(current_color, panel_w=hsv_panel_w)
-    ctrl_h, ctrl_w = ctrl_panel.shape[:2]
-    cv2.rectangle(canvas, (ctrl_panel_x, ctrl_panel_y), (ctrl_panel_x+ctrl_w, ctrl_panel_y+ctrl_h), (220,220,220), -1)
-    canvas = draw_chinese_text(canvas, "控制面板", (ctrl_panel_x, ctrl_panel_y - 35), font_size=28, color=(0,0,0))
-    # 修正：確保不超出 canvas
-    y1 = int(ctrl_panel_y)
-    y2 = min(y1 + ctrl_h, canvas.shape[0])
-    x1 = int(ctrl_panel_x)
-    x2 = min(x1 + ctrl_w, canvas.shape[1])
-    panel_crop = ctrl_panel[:y2-y1, :x2-x1]
-    canvas[y1:y2, x1:x2] = panel_crop
-
-    # 顯示計數器內容（左上角）
-    if label_counter is not None and len(label_counter) > 0:
-        counter_text = "計數器："
-        x_base = 30
-        y_base = 110  # 往下移動一點（原本是60）
-        canvas = draw_chinese_text(canvas, counter_text, (x_base, y_base), font_size=28, color=(0,0,255))
-        for i, (label, count) in enumerate(label_counter.most_common()):
-            text = f"{label}: {count}"
-            canvas = draw_chinese_text(canvas, text, (x_base, y_base + 35 + i*32), font_size=26, color=(0,0,180))
-
-    # 顯示模式
-    # mode_text = f"模式：{'一般' if current_mode == MODE_AUTO else '模擬'}"
-    # canvas = draw_chinese_text(canvas, mode_text, (30, 70), font_size=28, color=(0,128,255))
-
-    return canvas
+def draw_combined_ui(main_img, hsv_values, current_color, mask=None, label_counter=None):
+    if zone_drag is not None:
+        x0, y0, x1, y1 = zone_drag
+        work_zone_rect = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+    else:
+        work_zone_rect = work_zone.rect if work_zone is not None else None
+    return _compositor.render(main_img, hsv_values, current_color, mask, label_counter, work_zone_rect)
+
+def sync_color_config():
+    """Returns the compiled color config, recompiling it only if hsv_values changed."""
+    global hsv_dirty
+    if hsv_dirty:
+        live_color_ranges[current_color_to_adjust] = deepcopy(hsv_values)
+        color_config.update(live_color_ranges)
+        hsv_dirty = False
+    return color_config.current
 
 def on_all_in_one_mouse(event, x, y, flags, param):
-    global current_action_from_buttons, dragging, hsv_values, hovered_button_idx
+    global current_action_from_buttons, dragging, hsv_values, hovered_button_idx, work_zone, zone_drag, work_zone_changed, hsv_dirty
     canvas_h, canvas_w = CANVAS_H, CANVAS_W
     hsv_panel_w = int(canvas_w * 0.22)
     ctrl_panel_x = int(canvas_w * 0.75)
@@ -241,6 +329,30 @@ def on_all_in_one_mouse(event, x, y, flags, param):
         if hovered_button_idx != hovered:
             hovered_button_idx = hovered
 
+    # 工作區：在攝影機畫面上按住左鍵拖曳框選，右鍵清除（整張畫面）
+    c = _compositor
+    in_main = c.main_x <= x < c.main_x + c.main_w and c.main_y <= y < c.main_y + c.main_h
+    nx = min(1.0, max(0.0, (x - c.main_x) / c.main_w))
+    ny = min(1.0, max(0.0, (y - c.main_y) / c.main_h))
+    if zone_drag is not None:
+        if event == cv2.EVENT_MOUSEMOVE:
+            zone_drag[2], zone_drag[3] = nx, ny
+        elif event == cv2.EVENT_LBUTTONUP:
+            x0, y0, x1, y1 = zone_drag
+            zone_drag = None
+            if abs(x1 - x0) > 0.02 and abs(y1 - y0) > 0.02:  # 忽略單純點擊
+                work_zone = WorkZone(rect=(x0, y0, x1, y1))
+                work_zone_changed = True
+        return
+    if in_main and dragging is None:
+        if event == cv2.EVENT_LBUTTONDOWN:
+            zone_drag = [nx, ny, nx, ny]
+            return
+        if event == cv2.EVENT_RBUTTONDOWN and work_zone is not None:
+            work_zone = None
+            work_zone_changed = True
+            return
+
     # HSV滑動條互動區（完全用相對座標）
     hsv_panel_x = int(canvas_w * 0.75)
     hsv_panel_y = int(canvas_h * 0.08)
@@ -273,6 +385,7 @@ def on_all_in_one_mouse(event, x, y, flags, param):
                 hsv_values[0][idx] = min(value, hsv_values[1][idx]-1)
             else:
                 hsv_values[1][idx] = max(value, hsv_values[0][idx]+1)
+            hsv_dirty = True
 
 def show_auto_mode_confirm(live_color_ranges):
     panel_w, panel_h = 500, 360
@@ -419,31 +532,69 @@ MODE_AUTO = "auto"
 MODE_SIM = "sim"
 current_mode = MODE_AUTO  # 預設自動辨識
 sim_ready_pin = 0         # 模擬模式下的 ready_pin 狀態
+clock = system_clock      # 辨識時間窗、冷卻與繼電器時序共用的時鐘（測試時可換成 SimulatedClock）
+
+def trigger_vote_decision(arm_controller, decision):
+    """Sends the relay command for a finished recognition vote (if it produced a label)."""
+    if decision.label is None:
+        print(f"[MainLocal] 辨識視窗結束（{decision.elapsed:.2f} 秒），未偵測到目標")
+        return
+    print(f"[MainLocal] {decision.elapsed:.2f} 秒內判定為 {decision.label}（{decision.reason}，計數：{decision.votes}），送出對應訊號")
+    if hasattr(arm_controller, f"trigger_action_{decision.label}"):
+        getattr(arm_controller, f"trigger_action_{decision.label}")()
+
+def poll_pending_save():
+    """Shows the save feedback once the background writer reports the last Save written."""
+    global pending_save_token, save_feedback_end_time
+    if pending_save_token is None:
+        return
+    status = vision_config.config_save_status(pending_save_token)
+    if status is None:
+        return  # 仍在排隊或寫入中
+    pending_save_token = None
+    if status:
+        print("[MainLocal] Saved current HSV values for ALL colors to config.")
+        save_feedback_end_time = time.time() + 2 # 訊息顯示 2 秒
+    else:
+        print("[MainLocal] Error: saving the config failed; see the ConfigWriter messages above.")
 
 def main():
-    global current_color_to_adjust, current_action_from_buttons, live_color_ranges, hsv_values, ui_enabled, save_feedback_end_time, current_mode, sim_ready_pin
+    global current_color_to_adjust, current_action_from_buttons, live_color_ranges, hsv_values, ui_enabled, save_feedback_end_time, current_mode, sim_ready_pin, work_zone, work_zone_changed, hsv_dirty, pending_save_token
     parser = argparse.ArgumentParser(description="ARMCtrl OpenCV Application - Local Display Mode with HSV Adjustment")
     parser = add_common_arguments(parser)
     parser.add_argument('--show_debug_masks', action=argparse.BooleanOptionalAction, default=False, help="Show individual color mask windows for debugging.")
+    parser.add_argument('--vote_margin', type=int, default=5, help="Decide as soon as the leading label is this many votes ahead (0 disables).")
+    parser.add_argument('--vote_evidence', type=float, default=0.0, help="Decide once the leading label's summed log(score/(1-score)) reaches this value (0 disables).")
+    parser.add_argument('--vote_max_window', type=float, default=3.0, help="Maximum recognition window in seconds (fallback decision).")
+    parser.add_argument('--idle_capture', type=str, default="grab", choices=["off", "grab", "pause"], help="Headless capture policy while waiting for ready: keep decoding (off), grab without decoding (grab) or stop capturing (pause).")
+    parser.add_argument('--idle_flush_frames', type=int, default=2, help="Stale frames discarded from the camera buffer when the ready signal arrives.")
     args = parser.parse_args()
     cap, frame_width, frame_height, fps = initialize_camera(args.camera_index)
     if not cap:
         return
-    arm_controller = initialize_arm_controller(args)
-    state_manager = StateManager()
+    arm_controller = initialize_arm_controller(args, clock=clock)
+    state_manager = StateManager(clock=clock)
+    motion_gate = initialize_motion_gate(args, clock=clock)
+    tracker = initialize_tracker(args)
+    initialize_color_threads(args)
+    work_zone = vision_config.load_work_zone()
     live_color_ranges = deepcopy(vision_config.color_ranges)
     if not live_color_ranges or current_color_to_adjust not in live_color_ranges:
         initial_hsv_for_trackbar = vision_config.DEFAULT_COLOR_RANGES.get(current_color_to_adjust, [[0,0,0],[179,255,255]])
     else:
         initial_hsv_for_trackbar = live_color_ranges[current_color_to_adjust]
     hsv_values = deepcopy(initial_hsv_for_trackbar)
+    hsv_dirty = True
     cv2.namedWindow("ARMCtrl-ALL-IN-ONE")
     cv2.setMouseCallback("ARMCtrl-ALL-IN-ONE", on_all_in_one_mouse)
     print("[MainLocal] System running. Use UI buttons or press 'q' in the OpenCV window to quit.")
-    label_counter = Counter()
-    window_start_time = None
-    window_duration = 3  # 秒
-    in_recognition = False
+    # 辨識投票：達到領先票數差（或信心累積）即提早決定，最長 vote_max_window 秒
+    voter = SequentialVoter(
+        margin=args.vote_margin or None,
+        evidence_threshold=args.vote_evidence or None,
+        max_window=args.vote_max_window,
+        clock=clock
+    )
 
     running = True
     try:
@@ -456,51 +607,53 @@ def main():
             # 新增：無UI模式直接跳出主循環或執行無UI流程
             if not ui_enabled:
                 # print("[MainLocal] 進入無頭自動辨識模式")
-                in_recognition = False
-                window_start_time = None
-                label_counter.clear()
+                voter.reset()
+                # 待機時不解碼影格（grab/pause），省 CPU 與電力
+                idle_capture = hasattr(cap, "set_idle") and args.idle_capture != "off"
                 while True:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-                    # 取得 ready_pin 狀態
-                    ready_pin_state = 0
-                    if hasattr(arm_controller, "get_ready_pin"):
-                        ready_pin_state = arm_controller.get_ready_pin()
                     # 狀態機
-                    if not in_recognition:
-                        if ready_pin_state == 1:
-                            in_recognition = True
-                            window_start_time = time.time()
-                            label_counter.clear()
-                            print("[MainLocal] 進入辨識階段")
+                    if not voter.active:
+                        if idle_capture:
+                            cap.set_idle(args.idle_capture)
+                        # 待機：阻塞等待 ready_pin 上升緣（硬體邊緣偵測），收到即立刻喚醒
+                        if hasattr(arm_controller, "wait_for_ready"):
+                            ready = arm_controller.wait_for_ready(timeout=0.5)
                         else:
-                            time.sleep(0.05)
+                            ready = hasattr(arm_controller, "get_ready_pin") and arm_controller.get_ready_pin() == 1
+                            if not ready:
+                                time.sleep(0.05)
+                        if not ready:
+                            if not cap.isOpened():
+                                break
                             continue
-                    else:
-                        # 辨識階段
-                        live_color_ranges[current_color_to_adjust] = deepcopy(hsv_values)
-                        _, labels, _, labels_with_scores = process_frame_and_control_arm(
-                            frame, state_manager, None, live_color_ranges,
-                            show_debug_windows=False,
-                            return_scores=True
-                        )
-                        if labels_with_scores:
-                            top_label, top_score = max(labels_with_scores, key=lambda x: x[1])
-                            label_counter[top_label] += 1
-                            for label, score in labels_with_scores:
-                                if label != top_label and label_counter[label] > 0:
-                                    label_counter[label] -= 1
-                        now = time.time()
-                        if now - window_start_time >= window_duration:
-                            if label_counter:
-                                most_common_label, count = label_counter.most_common(1)[0]
-                                print(f"[MainLocal] 3秒內最多的是 {most_common_label}，計數：{count}，送出對應訊號")
-                                if hasattr(arm_controller, f"trigger_action_{most_common_label}"):
-                                    getattr(arm_controller, f"trigger_action_{most_common_label}")()
-                            in_recognition = False
-                            window_start_time = None
-                            label_counter.clear()
+                        if idle_capture:
+                            # ready 上升緣：丟掉驅動緩衝中的舊影格，確保第一張辨識影格是新的
+                            cap.resume(flush_frames=args.idle_flush_frames)
+                        if motion_gate:
+                            motion_gate.invalidate()  # 新的辨識週期一律先完整偵測
+                        if tracker:
+                            tracker.reset()
+                        voter.start()
+                        print("[MainLocal] 進入辨識階段")
+
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    # 辨識階段
+                    _, labels, _, labels_with_scores = process_frame_and_control_arm(
+                        frame, state_manager, None, sync_color_config(),
+                        show_debug_windows=False,
+                        return_scores=True,
+                        motion_gate=motion_gate,
+                        tracker=tracker,
+                        work_zone=work_zone,
+                        pyramid=args.pyramid
+                    )
+                    voter.add(labels_with_scores)
+                    decision = voter.decide()
+                    if decision:
+                        trigger_vote_decision(arm_controller, decision)
+                        voter.reset()
                 break  # 跳出主循環
 
             ret, frame = cap.read()
@@ -508,22 +661,27 @@ def main():
                 break
 
             # --- 立即處理按鈕動作 ---
+            poll_pending_save()
             if current_action_from_buttons == "save":
-                vision_config.save_color_ranges(live_color_ranges)
-                print("[MainLocal] Saved current HSV values for ALL colors to config.")
-                save_feedback_end_time = time.time() + 2 # 訊息顯示 2 秒
+                # 背景寫入，不阻塞 UI；寫入完成後 poll_pending_save 才顯示「儲存成功」
+                if vision_config.save_color_ranges(live_color_ranges) is not None:
+                    pending_save_token = vision_config.save_work_zone(work_zone)  # 較晚的 token 完成即代表兩者都已寫入
+                    print("[MainLocal] Current HSV values for ALL colors queued for saving.")
                 current_action_from_buttons = None
             elif current_action_from_buttons == "set_red":
                 current_color_to_adjust = "Red"
                 hsv_values = deepcopy(live_color_ranges.get("Red", [[0,0,0],[179,255,255]]))
+                hsv_dirty = True
                 current_action_from_buttons = None
             elif current_action_from_buttons == "set_blue":
                 current_color_to_adjust = "Blue"
                 hsv_values = deepcopy(live_color_ranges.get("Blue", [[100,100,100],[120,255,255]]))
+                hsv_dirty = True
                 current_action_from_buttons = None
             elif current_action_from_buttons == "set_green":
                 current_color_to_adjust = "Green"
                 hsv_values = deepcopy(live_color_ranges.get("Green", [[40,100,100],[80,255,255]]))  # 預設綠色範圍
+                hsv_dirty = True
                 current_action_from_buttons = None
             elif current_action_from_buttons == "quit":
                 print("[MainLocal] Quit button pressed.")
@@ -544,10 +702,15 @@ def main():
                     cleanup_resources(cap, arm_controller)
                     cap, frame_width, frame_height, fps = initialize_camera(cam_idx)
                     print(f"[MainLocal] 成功切換到攝影機 {cam_idx}.")
-                    arm_controller = initialize_arm_controller(args)
-                    state_manager = StateManager()
+                    arm_controller = initialize_arm_controller(args, clock=clock)
+                    state_manager = StateManager(clock=clock)
+                    if motion_gate:
+                        motion_gate.invalidate()
+                    if tracker:
+                        tracker.reset()
                     live_color_ranges = deepcopy(vision_config.color_ranges)
                     hsv_values = deepcopy(initial_hsv_for_trackbar)
+                    hsv_dirty = True
                     cv2.namedWindow("ARMCtrl-ALL-IN-ONE")
                     cv2.setMouseCallback("ARMCtrl-ALL-IN-ONE", on_all_in_one_mouse)
                     print("[MainLocal] 請重新設定 HSV 範圍.")
@@ -558,29 +721,37 @@ def main():
             if key == ord('a'):
                 current_mode = MODE_AUTO
                 print("[MainLocal] 切換到一般辨識模式")
-                in_recognition = False
-                window_start_time = None
-                label_counter.clear()
+                voter.reset()
             elif key == ord('s'):
                 current_mode = MODE_SIM
                 print("[MainLocal] 切換到模擬模式")
-                in_recognition = False
-                window_start_time = None
-                label_counter.clear()
+                voter.reset()
             elif key == ord('d') and current_mode == MODE_SIM:
                 sim_ready_pin = 1
                 print("[MainLocal] 模擬模式：ready_pin=1（進入辨識階段）")
             elif key == ord('q'):
                 break
 
+            # 工作區變更後，快取的偵測結果與追蹤框都不再有效
+            if work_zone_changed:
+                work_zone_changed = False
+                print(f"[MainLocal] 工作區：{work_zone.rect if work_zone is not None else '整張畫面'}")
+                if motion_gate:
+                    motion_gate.invalidate()
+                if tracker:
+                    tracker.reset()
+
             # --- 狀態機流程 ---
             if current_mode == MODE_AUTO:
                 # 自動辨識模式：每幀即時辨識，不做計數与統計
-                live_color_ranges[current_color_to_adjust] = deepcopy(hsv_values)
                 result_frame, labels, masks, labels_with_scores = process_frame_and_control_arm(
-                    frame, state_manager, None, live_color_ranges,
+                    frame, state_manager, None, sync_color_config(),
                     show_debug_windows=args.show_debug_masks,
-                    return_scores=True
+                    return_scores=True,
+                    motion_gate=motion_gate,
+                    tracker=tracker,
+                    work_zone=work_zone,
+                    pyramid=args.pyramid
                 )
                 current_mask = None
                 if isinstance(masks, dict):
@@ -600,11 +771,13 @@ def main():
                 ready_pin_state = sim_ready_pin
                 if hasattr(arm_controller, "get_ready_pin"):
                     ready_pin_state = ready_pin_state or arm_controller.get_ready_pin()
-                if not in_recognition:
+                if not voter.active:
                     if ready_pin_state == 1:
-                        in_recognition = True
-                        window_start_time = time.time()
-                        label_counter.clear()
+                        if motion_gate:
+                            motion_gate.invalidate()  # 新的辨識週期一律先完整偵測
+                        if tracker:
+                            tracker.reset()
+                        voter.start()
                         print("[MainLocal] 進入辨識階段")
                     else:
                         standby_frame = frame.copy()
@@ -618,30 +791,20 @@ def main():
                         continue
                 else:
                     # 辨識階段
-                    live_color_ranges[current_color_to_adjust] = deepcopy(hsv_values)
                     result_frame, labels, masks, labels_with_scores = process_frame_and_control_arm(
-                        frame, state_manager, None, live_color_ranges,
+                        frame, state_manager, None, sync_color_config(),
                         show_debug_windows=args.show_debug_masks,
-                        return_scores=True
+                        return_scores=True,
+                        motion_gate=motion_gate,
+                        tracker=tracker,
+                        work_zone=work_zone,
+                        pyramid=args.pyramid
                     )
-                    if labels_with_scores:
-                        top_label, top_score = max(labels_with_scores, key=lambda x: x[1])
-                        label_counter[top_label] += 1
-                        for label, score in labels_with_scores:
-                            if label != top_label and label_counter[label] > 0:
-                                label_counter[label] -= 1
-
-                    now = time.time()
-                    if now - window_start_time >= window_duration:
-                        if label_counter:
-                            most_common_label, count = label_counter.most_common(1)[0]
-                            print(f"[MainLocal] 3秒內最多的是 {most_common_label}，計數：{count}，送出對應訊號")
-                            if hasattr(arm_controller, f"trigger_action_{most_common_label}"):
-                                getattr(arm_controller, f"trigger_action_{most_common_label}")()
-                        # 回到待機階段
-                        in_recognition = False
-                        window_start_time = None
-                        label_counter.clear()
+                    voter.add(labels_with_scores)
+                    decision = voter.decide()
+                    if decision:
+                        trigger_vote_decision(arm_controller, decision)
+                        # 回到待機階段（計數器保留至本幀顯示完畢）
                         sim_ready_pin = 0  # <--- 新增這行，讓 ready_pin 歸零
 
                     current_mask = None
@@ -649,7 +812,7 @@ def main():
                         current_mask = masks.get(current_color_to_adjust)
                     else:
                         current_mask = masks
-                    combined = draw_combined_ui(result_frame, hsv_values, current_color_to_adjust, current_mask, label_counter=label_counter)
+                    combined = draw_combined_ui(result_frame, hsv_values, current_color_to_adjust, current_mask, label_counter=voter.counter)
                     cv2.imshow("ARMCtrl-ALL-IN-ONE", combined)
                     # 補上主視窗關閉檢查
                     if cv2.getWindowProperty("ARMCtrl-ALL-IN-ONE", cv2.WND_PROP_VISIBLE) < 1:
@@ -658,22 +821,27 @@ def main():
                         break
 
             # 按鈕動作
+            poll_pending_save()
             if current_action_from_buttons == "save":
-                vision_config.save_color_ranges(live_color_ranges)
-                print("[MainLocal] Saved current HSV values for ALL colors to config.")
-                save_feedback_end_time = time.time() + 2 # 訊息顯示 2 秒
+                # 背景寫入，不阻塞 UI；寫入完成後 poll_pending_save 才顯示「儲存成功」
+                if vision_config.save_color_ranges(live_color_ranges) is not None:
+                    pending_save_token = vision_config.save_work_zone(work_zone)  # 較晚的 token 完成即代表兩者都已寫入
+                    print("[MainLocal] Current HSV values for ALL colors queued for saving.")
                 current_action_from_buttons = None
             elif current_action_from_buttons == "set_red":
                 current_color_to_adjust = "Red"
                 hsv_values = deepcopy(live_color_ranges.get("Red", [[0,0,0],[179,255,255]]))
+                hsv_dirty = True
                 current_action_from_buttons = None
             elif current_action_from_buttons == "set_blue":
                 current_color_to_adjust = "Blue"
                 hsv_values = deepcopy(live_color_ranges.get("Blue", [[100,100,100],[120,255,255]]))
+                hsv_dirty = True
                 current_action_from_buttons = None
             elif current_action_from_buttons == "set_green":
                 current_color_to_adjust = "Green"
                 hsv_values = deepcopy(live_color_ranges.get("Green", [[40,100,100],[80,255,255]]))  # 預設綠色範圍
+                hsv_dirty = True
                 current_action_from_buttons = None
             elif current_action_from_buttons == "quit":
                 print("[MainLocal] Quit button pressed.")
@@ -695,10 +863,15 @@ def main():
                     cleanup_resources(cap, arm_controller)
                     cap, frame_width, frame_height, fps = initialize_camera(cam_idx)
                     print(f"[MainLocal] 成功切換到攝影機 {cam_idx}.")
-                    arm_controller = initialize_arm_controller(args)
-                    state_manager = StateManager()
+                    arm_controller = initialize_arm_controller(args, clock=clock)
+                    state_manager = StateManager(clock=clock)
+                    if motion_gate:
+                        motion_gate.invalidate()
+                    if tracker:
+                        tracker.reset()
                     live_color_ranges = deepcopy(vision_config.color_ranges)
                     hsv_values = deepcopy(initial_hsv_for_trackbar)
+                    hsv_dirty = True
                     cv2.namedWindow("ARMCtrl-ALL-IN-ONE")
                     cv2.setMouseCallback("ARMCtrl-ALL-IN-ONE", on_all_in_one_mouse)
                     print("[MainLocal] 請重新設定 HSV 範圍.")
@@ -710,6 +883,13 @@ def main():
         print("\n[MainLocal] Program interrupted by user (Ctrl+C).")
     finally:
         print("[MainLocal] Cleaning up resources...")
+        if motion_gate:
+            print(f"[MainLocal] Motion gate stats: {motion_gate.get_stats()}")
+        if tracker:
+            print(f"[MainLocal] ROI tracker stats: {tracker.get_stats()}")
+        if arm_controller is not None:
+            print(f"[MainLocal] Arm command stats: {arm_controller.get_command_stats()}")
+            print(f"[MainLocal] Arm cycle stats: {arm_controller.get_cycle_stats()}")
         cleanup_resources(cap, arm_controller)
         cv2.destroyAllWindows()
 
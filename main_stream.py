@@ -9,12 +9,22 @@ from utils.app_core import (
     add_common_arguments,
     initialize_camera,
     initialize_arm_controller,
+    initialize_motion_gate,
+    initialize_tracker,
+    initialize_color_threads,
     process_frame_and_control_arm,
+    trigger_arm_action,
     cleanup_resources as app_core_cleanup, # Renamed to avoid conflict
     get_local_ip,
     StateManager
 )
-from utils.vision_processing.config import load_color_ranges, COLOR_CONFIG_PATH # Added import
+from utils.vision_processing.config import load_color_ranges, read_color_ranges, COLOR_CONFIG_PATH # Added import
+from utils.vision_processing.config import load_work_zone, WORK_ZONE_CONFIG_PATH
+from utils.vision_processing.resolution_governor import ResolutionGovernor
+from utils.vision_processing.compiled_config import ColorConfigHolder
+from utils.vision_processing.parallel_pipeline import ParallelDetectionPipeline
+from utils.vision_processing import config as vision_config
+from utils.config_watcher import ConfigWatcher
 
 # --- Path to mediamtx and its config ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -30,18 +40,45 @@ class StreamApplication:
         self.fps = None
         self.arm_controller = None
         self.state_manager = None
+        self.motion_gate = None
+        self.tracker = None
+        self.governor = None
+        self.pipeline = None
         self.pusher = None
+        self.config_watcher = None
         self.mediamtx_process = None
         
         self.mediamtx_bin = MEDIAMTX_BIN_DEFAULT
         self.mediamtx_config = MEDIAMTX_CONFIG_DEFAULT
 
+        # 偵測迴圈讀取已編譯的 color_config.current；設定變更時整個替換
+        self.color_config = ColorConfigHolder(vision_config.action_map, lambda: vision_config.min_component_area)
         self.current_color_ranges = {}
-        self.last_config_mod_time = 0
         self._load_initial_color_config()
 
+        self.work_zone = load_work_zone()
+        # 由監看執行緒設定，偵測迴圈在下一張影格重置 motion gate / tracker
+        self._detection_state_stale = False
+
         self._initialize_components()
 
+        # 設定檔變更由背景執行緒（inotify，不支援時輪詢）送達，不在擷取迴圈中檢查
+        self.config_watcher = ConfigWatcher(
+            [COLOR_CONFIG_PATH, WORK_ZONE_CONFIG_PATH],
+            self._on_config_file_changed,
+            debounce=args.config_debounce,
+            use_inotify=not args.config_poll
+        )
+
+    @property
+    def current_color_ranges(self):
+        return self._current_color_ranges
+
+    @current_color_ranges.setter
+    def current_color_ranges(self, color_ranges):
+        self._current_color_ranges = color_ranges
+        self.color_config.update(color_ranges)
+
     def _load_initial_color_config(self):
         """Loads the initial color configuration."""
         print(f"[StreamApp] Loading initial color configuration from {COLOR_CONFIG_PATH}...")
@@ -50,49 +87,35 @@ class StreamApplication:
             print("[StreamApp] Warning: No color ranges loaded. Detection might not work as expected.")
         else:
             print(f"[StreamApp] Initial color ranges loaded: {list(self.current_color_ranges.keys())}")
-        
-        try:
-            if os.path.exists(COLOR_CONFIG_PATH):
-                self.last_config_mod_time = os.path.getmtime(COLOR_CONFIG_PATH)
-            else:
-                print(f"[StreamApp] Color config file {COLOR_CONFIG_PATH} not found during initial load for mod time.")
-                self.last_config_mod_time = 0
-        except OSError as e:
-            print(f"[StreamApp] Error getting modification time for {COLOR_CONFIG_PATH}: {e}")
-            self.last_config_mod_time = 0
 
+    def _on_config_file_changed(self, path):
+        """ConfigWatcher callback (runs on the watcher thread)."""
+        if path == str(COLOR_CONFIG_PATH):
+            self._reload_color_config()
+        elif path == str(WORK_ZONE_CONFIG_PATH):
+            self._reload_work_zone()
 
-    def _check_and_reload_color_config(self):
-        """Checks if the color config file has been modified and reloads it if necessary."""
-        try:
-            if not os.path.exists(COLOR_CONFIG_PATH):
-                # If file was deleted after initial load
-                if self.current_color_ranges: # Only clear if it previously had content
-                    print(f"[StreamApp] Color config file {COLOR_CONFIG_PATH} deleted. Clearing current ranges.")
-                    self.current_color_ranges = {}
-                    self.last_config_mod_time = 0
-                return
-
-            current_mod_time = os.path.getmtime(COLOR_CONFIG_PATH)
-            if current_mod_time != self.last_config_mod_time:
-                print(f"[StreamApp] Change detected in {COLOR_CONFIG_PATH}. Reloading color configuration...")
-                reloaded_ranges = load_color_ranges()
-                if reloaded_ranges is not None: # load_color_ranges returns {} on error/not found, not None
-                    self.current_color_ranges = reloaded_ranges
-                    self.last_config_mod_time = current_mod_time
-                    print(f"[StreamApp] Color configuration reloaded. Active colors: {list(self.current_color_ranges.keys())}")
-                else:
-                    # This case should not be hit if load_color_ranges always returns a dict
-                    print(f"[StreamApp] Failed to reload color configuration from {COLOR_CONFIG_PATH}. Keeping previous settings.")
-        except FileNotFoundError:
-            # This can happen if the file is deleted between os.path.exists and os.path.getmtime
-            # Or if it was created after initial check and then deleted.
+    def _reload_color_config(self):
+        """Validates and compiles the changed color config; invalid files keep the previous settings."""
+        if not os.path.exists(COLOR_CONFIG_PATH):
             if self.current_color_ranges: # Only clear if it previously had content
-                print(f"[StreamApp] Color config file {COLOR_CONFIG_PATH} not found during check. Clearing current ranges.")
+                print(f"[StreamApp] Color config file {COLOR_CONFIG_PATH} deleted. Clearing current ranges.")
                 self.current_color_ranges = {}
-            self.last_config_mod_time = 0 # Reset mod time as file is gone
-        except OSError as e:
-            print(f"[StreamApp] Error checking/reloading color config: {e}")
+            return
+        try:
+            reloaded_ranges = read_color_ranges(COLOR_CONFIG_PATH)
+        except (OSError, ValueError) as e:
+            print(f"[StreamApp] Invalid color config in {COLOR_CONFIG_PATH} ({e}). Keeping previous settings.")
+            return
+        # setter 編譯後一次替換 color_config.current，偵測迴圈下一張影格即使用新設定
+        self.current_color_ranges = reloaded_ranges
+        print(f"[StreamApp] Color configuration reloaded (v{self.color_config.version}). Active colors: {list(reloaded_ranges.keys())}")
+
+    def _reload_work_zone(self):
+        """Reloads the work zone after work_zone.json was created, modified or removed."""
+        self.work_zone = load_work_zone()
+        self._detection_state_stale = True
+        print(f"[StreamApp] Work zone: {self.work_zone.rect if self.work_zone is not None else 'full frame'}")
 
     def _initialize_components(self):
         print("[StreamApp] Initializing components...")
@@ -102,6 +125,25 @@ class StreamApplication:
 
         self.arm_controller = initialize_arm_controller(self.args)
         self.state_manager = StateManager()
+        if self.args.detect_workers > 0:
+            # 多行程逐幀平行偵測（共享記憶體環的大小依第一張影格決定）；
+            # motion gate / tracker / governor 需要前一幀的狀態，此模式不使用
+            print("[StreamApp] Pipeline mode: motion gate, ROI tracking and resolution governor are disabled.")
+            print("[StreamApp] Components initialized.")
+            return
+        self.motion_gate = initialize_motion_gate(self.args)
+        self.tracker = initialize_tracker(self.args)
+        initialize_color_threads(self.args)
+        if self.args.target_fps > 0:
+            # 從 --pyramid 指定的比例開始，延遲超出預算時逐級降低解析度（必要時跳幀）
+            scales = tuple(scale for scale in (1, 2, 4) if scale >= self.args.pyramid)
+            self.governor = ResolutionGovernor(
+                self.args.target_fps,
+                scales=scales,
+                max_skip=self.args.governor_max_skip,
+                window=self.args.governor_window
+            )
+            print(f"[StreamApp] Resolution governor targeting {self.args.target_fps} FPS.")
         print("[StreamApp] Components initialized.")
 
     def _start_mediamtx_server(self):
@@ -158,7 +200,16 @@ class StreamApplication:
             self.pusher = None
             return
             
-        self.pusher = RTSPPusher(rtsp_url_internal, width=self.frame_width, height=self.frame_height, fps=self.fps)
+        self.pusher = RTSPPusher(
+            rtsp_url_internal,
+            width=self.frame_width,
+            height=self.frame_height,
+            fps=self.fps,
+            async_mode=self.args.push_async,
+            queue_size=self.args.push_queue_size,
+            drop_policy=self.args.push_drop_policy,
+            pixel_format=self.args.push_pixel_format
+        )
         
         pi_ip = get_local_ip()
         if pi_ip != "N/A":
@@ -179,44 +230,91 @@ class StreamApplication:
             print("[StreamApp] Failed to initialize RTSP pusher. Exiting.")
             return
 
-        # Initialize a counter for less frequent checks, e.g., every N frames or X seconds
-        check_config_interval_seconds = 5 # Check every 5 seconds
-        last_config_check_time = time.time()
+        self.config_watcher.start()
 
         while True:
             if not self.cap or not self.cap.isOpened():
                 print("[StreamApp] Error: Camera not available or closed.")
                 break
             
-            current_time = time.time()
-            if current_time - last_config_check_time > check_config_interval_seconds:
-                self._check_and_reload_color_config()
-                last_config_check_time = current_time
+            if self._detection_state_stale:
+                self._detection_state_stale = False
+                if self.motion_gate:
+                    self.motion_gate.invalidate()
+                if self.tracker:
+                    self.tracker.reset()
 
             ret, frame = self.cap.read()
             if not ret:
                 print("[StreamApp] Error: Can't receive frame (stream end or camera error?). Exiting ...")
                 break
 
+            if self.args.detect_workers > 0:
+                self._run_pipeline_step(frame)
+                continue
+
+            if self.governor and not self.governor.should_process():
+                # 跳幀：不做偵測，直接推原始影像維持串流幀率
+                if self.pusher:
+                    self.pusher.push_frame(frame)
+                continue
+
+            detect_start = time.perf_counter()
             # Corrected unpacking to match the 3 return values from process_frame_and_control_arm
             result_frame, labels, mask = process_frame_and_control_arm(
                 frame, 
                 self.state_manager, 
                 self.arm_controller,
-                current_color_ranges=self.current_color_ranges # Pass the potentially updated ranges
+                current_color_ranges=self.color_config.current, # Compiled, swapped on reload
+                motion_gate=self.motion_gate,
+                tracker=self.tracker,
+                work_zone=self.work_zone,
+                pyramid=self.governor.scale if self.governor else self.args.pyramid
             )
+            if self.governor:
+                self.governor.record(time.perf_counter() - detect_start)
             
             if self.pusher:
                 self.pusher.push_frame(result_frame)
             
             # time.sleep(0.001) # Optional delay, consider removing or making configurable if it impacts performance
 
+    def _run_pipeline_step(self, frame):
+        """Hands `frame` to the detector processes and pushes the results that are ready, in frame order."""
+        if self.pipeline is None:
+            self.pipeline = ParallelDetectionPipeline(
+                frame.shape,
+                workers=self.args.detect_workers,
+                slots=self.args.pipeline_slots or None
+            ).start()
+        self.pipeline.submit(frame, self.color_config.current, self.work_zone, pyramid=self.args.pyramid)
+        for _seq, result_frame, labels, _labels_with_scores in self.pipeline.collect():
+            trigger_arm_action(labels, self.state_manager, self.arm_controller)
+            if self.pusher:
+                self.pusher.push_frame(result_frame)
+
     def cleanup(self):
         print("[StreamApp] Cleaning up resources...")
+        if self.config_watcher:
+            self.config_watcher.stop()
+        if self.arm_controller is not None:
+            print(f"[StreamApp] Arm command stats: {self.arm_controller.get_command_stats()}")
+            print(f"[StreamApp] Arm cycle stats: {self.arm_controller.get_cycle_stats()}")
         # Pass self.cap and self.arm_controller to the cleanup function from app_core
         app_core_cleanup(self.cap, self.arm_controller) 
+
+        if self.motion_gate:
+            print(f"[StreamApp] Motion gate stats: {self.motion_gate.get_stats()}")
+        if self.tracker:
+            print(f"[StreamApp] ROI tracker stats: {self.tracker.get_stats()}")
+        if self.governor:
+            print(f"[StreamApp] Resolution governor stats: {self.governor.get_stats()}")
+        if self.pipeline:
+            print(f"[StreamApp] Detection pipeline stats: {self.pipeline.get_stats()}")
+            self.pipeline.stop()
         
         if self.pusher:
+            print(f"[StreamApp] RTSP Pusher stats: {self.pusher.get_stats()}")
             self.pusher.release()
             print("[StreamApp] RTSP Pusher released.")
 
@@ -255,6 +353,71 @@ def main():
         default='/live',
         help="Path for the RTSP stream (e.g., /live, /mystream)."
     )
+    parser.add_argument(
+        '--push_async',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Push frames through a bounded queue and a dedicated FFmpeg writer thread (drops frames when FFmpeg falls behind)."
+    )
+    parser.add_argument(
+        '--push_queue_size',
+        type=int,
+        default=2,
+        help="Maximum number of frames waiting to be written to FFmpeg (async push)."
+    )
+    parser.add_argument(
+        '--push_drop_policy',
+        choices=['drop_oldest', 'drop_newest'],
+        default='drop_oldest',
+        help="Which frame to drop when the push queue is full (async push)."
+    )
+    parser.add_argument(
+        '--push_pixel_format',
+        choices=['bgr24', 'yuv420p', 'nv12'],
+        default='bgr24',
+        help="Raw pixel format piped to FFmpeg; yuv420p/nv12 (opt-in, even frame size) are converted in OpenCV and halve pipe bandwidth."
+    )
+    parser.add_argument(
+        '--target_fps',
+        type=float,
+        default=0,
+        help="Adapt the detection scale (and frame skipping) to hold this frame rate (0 = off)."
+    )
+    parser.add_argument(
+        '--governor_max_skip',
+        type=int,
+        default=0,
+        help="Governor: maximum frames skipped between detections once the smallest scale is reached."
+    )
+    parser.add_argument(
+        '--governor_window',
+        type=int,
+        default=30,
+        help="Governor: number of detections in the moving latency window."
+    )
+    parser.add_argument(
+        '--detect_workers',
+        type=int,
+        default=0,
+        help="Run detection in this many worker processes (frame-parallel pipeline); 0 = in the main loop."
+    )
+    parser.add_argument(
+        '--pipeline_slots',
+        type=int,
+        default=0,
+        help="Shared-memory frame slots for the pipeline (default: 2 x detect_workers)."
+    )
+    parser.add_argument(
+        '--config_poll',
+        action='store_true',
+        help="Watch the config files by polling their mtime instead of inotify."
+    )
+    parser.add_argument(
+        '--config_debounce',
+        type=float,
+        default=0.01,
+        help="Seconds a changed config file must stay quiet before it is reloaded."
+    )
     args = parser.parse_args()
 
     app = None
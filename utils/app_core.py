@@ -9,6 +9,10 @@ from .arm_controller.pi_gpio_controller import PiGPIOController, RPI_GPIO_AVAILA
 # Updated import path for vision_processing
 from .vision_processing import detect_target, config as vision_config # Import config
 from .vision_processing.state_manager import StateManager
+from .vision_processing.motion_gate import MotionGate
+from .vision_processing.roi_tracker import ROITracker
+from .vision_processing.detector import set_color_threads
+from .camera_capture import ThreadedCapture
 
 # --- Default GPIO Pin configurations (BCM Mode) ---
 DEFAULT_RELAY_PINS = [17, 27, 22, 23]
@@ -59,10 +63,99 @@ def add_common_arguments(parser):
         default=26,
         help="GPIO pin for ready signal (default: 26)"
     )
+    parser.add_argument(
+        '--arm_queue_size',
+        type=int,
+        default=4,
+        help="Maximum number of pending relay sequences for the arm actuator worker (default: 4)"
+    )
+    parser.add_argument(
+        '--arm_queue_policy',
+        choices=['reject', 'drop_oldest'],
+        default='reject',
+        help="What to do with a new arm command when the queue is full (default: reject)"
+    )
+    parser.add_argument(
+        '--arm_protocol',
+        choices=['timed', 'ack'],
+        default='timed',
+        help="Relay protocol: 'timed' (fixed 1s setup / 7s hold) or 'ack' (release R1 once the device acknowledges)"
+    )
+    parser.add_argument(
+        '--ack_pin',
+        type=int,
+        default=None,
+        help="GPIO pin used as acknowledgement in ack protocol (default: the ready pin)"
+    )
+    parser.add_argument(
+        '--ack_setup_min',
+        type=float,
+        default=0.05,
+        help="Ack protocol: seconds the data bits settle before R1 is raised (default: 0.05)"
+    )
+    parser.add_argument(
+        '--ack_hold_min',
+        type=float,
+        default=0.1,
+        help="Ack protocol: minimum seconds R1 stays high (default: 0.1)"
+    )
+    parser.add_argument(
+        '--ack_timeout',
+        type=float,
+        default=7.0,
+        help="Ack protocol: seconds to wait for the ack before falling back to the timed hold (default: 7)"
+    )
+    parser.add_argument(
+        '--motion_gate',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Reuse the previous detection result while the scene does not change"
+    )
+    parser.add_argument(
+        '--motion_threshold',
+        type=float,
+        default=0.005,
+        help="Fraction of changed thumbnail pixels that counts as motion (default: 0.005)"
+    )
+    parser.add_argument(
+        '--motion_refresh',
+        type=float,
+        default=1.0,
+        help="Force a full detection at least every N seconds even without motion (default: 1.0)"
+    )
+    parser.add_argument(
+        '--roi_tracking',
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Only scan padded regions around the tracked targets, with periodic full-frame rescans"
+    )
+    parser.add_argument(
+        '--full_scan_interval',
+        type=int,
+        default=15,
+        help="ROI tracking: do a full-frame scan at least every N frames (default: 15)"
+    )
+    parser.add_argument(
+        '--pyramid',
+        type=int,
+        choices=[1, 2, 4],
+        default=1,
+        help="Coarse-to-fine detection: segment at 1/N resolution, refine candidates at full resolution (1 = off)"
+    )
+    parser.add_argument(
+        '--color_threads',
+        type=int,
+        default=0,
+        help="Process the colors of each frame in parallel on this many threads (0/1 = serial)"
+    )
     return parser
 
-def initialize_camera(cap_source_str):
-    """Initializes the camera and returns the capture object and properties."""
+def initialize_camera(cap_source_str, threaded=True):
+    """
+    Initializes the camera and returns the capture object and properties.
+    With threaded=True the capture is a started ThreadedCapture (latest-frame,
+    drop-old semantics) that can be used exactly like a cv2.VideoCapture.
+    """
     if isinstance(cap_source_str, str) and (cap_source_str.startswith("http://") or cap_source_str.startswith("rtsp://")):
         print(f"[Core] Using IP camera: {cap_source_str}")
         cap_source = cap_source_str
@@ -86,9 +179,12 @@ def initialize_camera(cap_source_str):
     fps = int(raw_fps if raw_fps and 5 <= raw_fps <= 120 else 30)  # Default to 30 FPS if invalid
 
     print(f"[Core] Camera initialized: {frame_width}x{frame_height} at {fps} FPS.")
+    if threaded:
+        cap = ThreadedCapture(cap).start()
+        print("[Core] Background frame grabber started.")
     return cap, frame_width, frame_height, fps
 
-def initialize_arm_controller(args):
+def initialize_arm_controller(args, clock=None):
     """Initializes and returns the arm controller based on parsed arguments."""
     if not RPI_GPIO_AVAILABLE:
         print("[Core] WARNING: RPi.GPIO library not found or not running on a Raspberry Pi. Arm control will be simulated.")
@@ -100,21 +196,46 @@ def initialize_arm_controller(args):
         relay_pins=args.relay_pins, 
         led_pin=args.led_pin, 
         inverse_logic=args.arm_inverse_logic,
-        ready_pin=getattr(args, "ready_pin", 26)  # 預設 26
+        ready_pin=getattr(args, "ready_pin", 26),  # 預設 26
+        command_queue_size=getattr(args, "arm_queue_size", 4),
+        queue_full_policy=getattr(args, "arm_queue_policy", "reject"),
+        protocol_mode=getattr(args, "arm_protocol", "timed"),
+        ack_pin=getattr(args, "ack_pin", None),
+        setup_min_seconds=getattr(args, "ack_setup_min", 0.05),
+        hold_min_seconds=getattr(args, "ack_hold_min", 0.1),
+        ack_timeout_seconds=getattr(args, "ack_timeout", 7.0),
+        clock=clock
     )
     print(f"[Core] Arm controller initialized with GPIO pins: Relays {args.relay_pins}, LED {args.led_pin}. Inverse Logic: {args.arm_inverse_logic}")
     return arm_controller
 
-def process_frame_and_control_arm(frame, state_manager, arm_controller, current_color_ranges, show_debug_windows=False, return_scores=False):
-    """Processes a single frame for target detection and controls the arm."""
-    # detect_target now returns labels like ['A', 'B'] based on color+shape and action_map
-    result = detect_target(frame.copy(), current_color_ranges, show_debug_windows=show_debug_windows)
-    if len(result) == 4:
-        result_frame, detected_actions, mask, labels_with_scores = result
-    else:
-        result_frame, detected_actions, mask = result
-        labels_with_scores = []
+def initialize_motion_gate(args, clock=None):
+    """Returns a MotionGate configured from the parsed arguments, or None if disabled."""
+    if not getattr(args, "motion_gate", False):
+        return None
+    print(f"[Core] Motion gate enabled (threshold={args.motion_threshold}, refresh={args.motion_refresh}s).")
+    return MotionGate(
+        change_threshold=args.motion_threshold,
+        refresh_interval=args.motion_refresh,
+        clock=clock
+    )
 
+def initialize_color_threads(args):
+    """Starts the per-color detection thread pool if --color_threads > 1."""
+    threads = getattr(args, "color_threads", 0)
+    set_color_threads(threads)
+    if threads > 1:
+        print(f"[Core] Per-color detection on {threads} threads.")
+
+def initialize_tracker(args):
+    """Returns a ROITracker if ROI tracking is enabled, else None."""
+    if not getattr(args, "roi_tracking", False):
+        return None
+    print(f"[Core] ROI tracking enabled (full scan every {args.full_scan_interval} frames).")
+    return ROITracker(full_scan_interval=args.full_scan_interval)
+
+def trigger_arm_action(detected_actions, state_manager, arm_controller):
+    """Triggers the arm for the first detected action label, honouring the StateManager cooldown."""
     if detected_actions and arm_controller:  # 只有 arm_controller 不為 None 才執行動作
         # Process the first detected action
         # In a real scenario, you might need a more sophisticated way to prioritize if multiple actions are detected
@@ -145,14 +266,42 @@ def process_frame_and_control_arm(frame, state_manager, arm_controller, current_
         if action_to_perform_method and action_name_for_state_manager:
             if state_manager.can_perform_action(action_name_for_state_manager, cooldown_seconds=7):
                 print(f"[Core] Detected action '{first_action_label}', triggering {action_name_for_state_manager}.")
-                action_to_perform_method() # Execute the arm action method
-                state_manager.reset_action_cooldown(action_name_for_state_manager)  # Ensure cooldown is reset after action
+                if action_to_perform_method(): # Queue the arm action; False if the command queue rejected it
+                    state_manager.reset_action_cooldown(action_name_for_state_manager)  # Ensure cooldown is reset after action
+                else:
+                    # 指令被拒絕時不進入冷卻，下一次有效偵測仍可觸發
+                    state_manager.clear_action_cooldown(action_name_for_state_manager)
+                    print(f"[Core] {action_name_for_state_manager} was rejected by the arm controller; cooldown not started.")
             else:
                 print(f"[Core] Detected action '{first_action_label}', but {action_name_for_state_manager} is on cooldown.")
                 action_to_perform_method = None  # Ensure no action is performed during cooldown
         elif detected_actions: # An action label was detected but not mapped to a method
             print(f"[Core] Detected action label '{first_action_label}' has no defined arm trigger method.")
 
+def process_frame_and_control_arm(frame, state_manager, arm_controller, current_color_ranges, show_debug_windows=False, return_scores=False, motion_gate=None, tracker=None, work_zone=None, pyramid=1):
+    """
+    Processes a single frame for target detection and controls the arm.
+    With a motion_gate, unchanged frames reuse the previous detection result;
+    with a tracker, only regions around the tracked targets are scanned;
+    with a work_zone, only that part of the frame is processed;
+    pyramid=2/4 selects the coarse-to-fine detection path.
+    """
+    result = None
+    if motion_gate is not None:
+        thumb, result = motion_gate.check(frame, current_color_ranges)
+    if result is None:
+        # detect_target now returns labels like ['A', 'B'] based on color+shape and action_map
+        result = detect_target(frame.copy(), current_color_ranges, show_debug_windows=show_debug_windows, tracker=tracker, work_zone=work_zone, pyramid=pyramid)
+        if motion_gate is not None:
+            motion_gate.store(thumb, result, current_color_ranges)
+    if len(result) == 4:
+        result_frame, detected_actions, mask, labels_with_scores = result
+    else:
+        result_frame, detected_actions, mask = result
+        labels_with_scores = []
+
+    trigger_arm_action(detected_actions, state_manager, arm_controller)
+
     if return_scores:
         return result_frame, detected_actions, mask, labels_with_scores
     else:
@@ -1,5 +1,8 @@
 # utils/arm_controller/pi_gpio_controller.py
 import time
+import threading
+from collections import deque
+from utils.clock import system_clock
 try:
     import RPi.GPIO as GPIO
     RPI_GPIO_AVAILABLE = True
@@ -10,21 +13,69 @@ except RuntimeError:
     print("[PiGPIOController] Error importing RPi.GPIO. This may mean you need to run as root or the library is not properly installed.")
     RPI_GPIO_AVAILABLE = False
 
+# Fixed timings of the original relay protocol (also the fallback of the ack protocol)
+TIMED_SETUP_SECONDS = 1.0  # data bits (R2-R4) settle before R1 is raised
+TIMED_HOLD_SECONDS = 7.0   # R1 held high
+
 class PiGPIOController:
-    def __init__(self, relay_pins, led_pin=None, inverse_logic=True, gpio_mode=None, ready_pin=None):
+    def __init__(self, relay_pins, led_pin=None, inverse_logic=True, gpio_mode=None, ready_pin=None, ready_bouncetime_ms=20,
+                 command_queue_size=4, queue_full_policy="reject",
+                 protocol_mode="timed", ack_pin=None, setup_min_seconds=0.05, hold_min_seconds=0.1,
+                 ack_timeout_seconds=TIMED_HOLD_SECONDS, clock=None):
         """
         Initialize the Raspberry Pi GPIO controller for arm relays.
         :param relay_pins: A list or tuple of 4 GPIO pin numbers (BCM mode) for relays 1-4.
         :param led_pin: GPIO pin number (BCM mode) for a test LED (optional).
         :param inverse_logic: True if relays are LOW active, False if HIGH active.
         :param gpio_mode: GPIO.BCM or GPIO.BOARD. Defaults to GPIO.BCM if RPi.GPIO is available.
+        :param ready_pin: GPIO pin (input) the downstream device raises when it is ready (optional).
+        :param ready_bouncetime_ms: Debounce time for ready_pin rising-edge detection.
+        :param command_queue_size: Maximum number of relay sequences waiting for the actuator worker.
+        :param queue_full_policy: "reject" refuses new commands when the queue is full,
+                                  "drop_oldest" discards the oldest pending command instead.
+        :param protocol_mode: "timed" keeps the fixed 1 s setup / 7 s hold. "ack" releases R1 as soon as
+                              the ack pin changes level after R1 is raised (the device latched the code).
+        :param ack_pin: GPIO pin (input) used as acknowledgement in "ack" mode. Defaults to ready_pin.
+        :param setup_min_seconds: "ack" mode: time the data bits settle before R1 is raised.
+        :param hold_min_seconds: "ack" mode: minimum time R1 stays high, even if the ack arrives earlier.
+        :param ack_timeout_seconds: "ack" mode: how long to wait for the ack before falling back to the
+                                    timed hold (R1 then stays high for TIMED_HOLD_SECONDS in total).
+        :param clock: Time source for relay sequences and ready/ack waits (utils.clock). Defaults to
+                      the system clock; pass a SimulatedClock to run sequences in virtual time.
         """
+        if queue_full_policy not in ("reject", "drop_oldest"):
+            raise ValueError(f"queue_full_policy must be 'reject' or 'drop_oldest', got {queue_full_policy!r}")
+        if protocol_mode not in ("timed", "ack"):
+            raise ValueError(f"protocol_mode must be 'timed' or 'ack', got {protocol_mode!r}")
         self.relay_pins = relay_pins
         self.led_pin = led_pin
         self.inverse_logic = inverse_logic
         self.rpi_gpio_available = RPI_GPIO_AVAILABLE
+        self.clock = clock or system_clock
         self.ready_pin = ready_pin
         self._ready_pin_state = 0  # 0=LOW, 1=HIGH
+        # Set on every ready_pin rising edge (GPIO edge detection, or set_ready_pin_sim in simulation)
+        self._ready_event = threading.Event()
+        self._ready_callbacks = []
+        self._ready_edge_detection = False
+        # Relay sequences run one at a time on a single long-lived worker thread
+        self.command_queue_size = command_queue_size
+        self.queue_full_policy = queue_full_policy
+        self._command_queue = deque()
+        self._command_cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._worker = None
+        self._executing = None
+        self.command_stats = {"accepted": 0, "coalesced": 0, "rejected": 0, "dropped": 0, "completed": 0}
+        # Relay protocol and cycle-time measurements
+        self.protocol_mode = protocol_mode
+        self.ack_pin = ack_pin
+        self._ack_pin_state = 0  # 模擬用 ack_pin 狀態（ack_pin 未設定時改用 ready_pin）
+        self.setup_min_seconds = setup_min_seconds
+        self.hold_min_seconds = hold_min_seconds
+        self.ack_timeout_seconds = ack_timeout_seconds
+        self._cycle_times = deque(maxlen=100)
+        self.cycle_stats = {"cycles": 0, "acked": 0, "ack_timeouts": 0, "aborted": 0}
 
         if not self.rpi_gpio_available:
             print("[PiGPIOController] Operating in simulation mode. No actual GPIO changes will occur.")
@@ -47,8 +98,16 @@ class PiGPIOController:
         if self.led_pin:
             GPIO.setup(self.led_pin, GPIO.OUT)
 
+        if self.ack_pin is not None and self.ack_pin != self.ready_pin:
+            GPIO.setup(self.ack_pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+
         if self.ready_pin is not None:
             GPIO.setup(self.ready_pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+            try:
+                GPIO.add_event_detect(self.ready_pin, GPIO.RISING, callback=self._on_ready_edge, bouncetime=ready_bouncetime_ms)
+                self._ready_edge_detection = True
+            except RuntimeError as e:
+                print(f"[PiGPIOController] Warning: edge detection unavailable on ready pin {self.ready_pin} ({e}). Falling back to polling.")
 
         self.all_relays_off() # Initialize relays to off state
 
@@ -137,45 +196,193 @@ class PiGPIOController:
 
     def _execute_arm_sequence_with_protocol(self, r2, r3, r4, action_name=""):
         """
-        Executes the arm sequence with a protocol ensuring reliable signal transmission.
+        Queues the arm sequence for the actuator worker, which runs it with a
+        protocol ensuring reliable signal transmission.
+        Returns True if the command was queued (or merged with an identical pending one).
         """
-        import threading
+        return self._enqueue_command((r2, r3, r4), action_name)
+
+    def _run_protocol_sequence(self, r2, r3, r4, action_name=""):
+        cycle_start = self.clock.time()
+        setup_seconds = TIMED_SETUP_SECONDS if self.protocol_mode == "timed" else self.setup_min_seconds
+        print(f"[PiGPIOController] Preparing {action_name} sequence...")
+        self._set_relay_state(0, False)  # R1 low to indicate signal not ready
+        self._set_relay_state(1, r2)     # R2
+        self._set_relay_state(2, r3)     # R3
+        self._set_relay_state(3, r4)     # R4
+        print(f"[PiGPIOController] {action_name} - Signal encoded: R1:{False}, R2:{r2}, R3:{r3}, R4:{r4}.")
+        if self.clock.wait(self._stop_event, setup_seconds):  # Let the data bits settle before activating R1
+            self._abort_cycle(action_name)
+            return
 
-        def sequence():
-            print(f"[PiGPIOController] Preparing {action_name} sequence...")
-            self._set_relay_state(0, False)  # R1 low to indicate signal not ready
-            self._set_relay_state(1, r2)     # R2
-            self._set_relay_state(2, r3)     # R3
-            self._set_relay_state(3, r4)     # R4
-            print(f"[PiGPIOController] {action_name} - Signal encoded: R1:{False}, R2:{r2}, R3:{r3}, R4:{r4}.")
-            time.sleep(1)  # Wait 1 second before activating R1
+        if self.protocol_mode != "timed":
+            # 拉高 R1 前先取樣 ack 電位並清除上升緣事件，裝置再快回應也不會漏掉
+            initial_ack = self._read_ack_pin()
+            self._ready_event.clear()
+        self._set_relay_state(0, True)  # R1 high to indicate valid signal
+        print(f"[PiGPIOController] {action_name} - Signal activated: R1:{True}, R2:{r2}, R3:{r3}, R4:{r4}.")
+        if self.protocol_mode == "timed":
+            self.clock.wait(self._stop_event, TIMED_HOLD_SECONDS)  # Maintain signal for 7 seconds
+            acked = None
+        else:
+            acked = self._hold_until_ack(initial_ack)
 
-            self._set_relay_state(0, True)  # R1 high to indicate valid signal
-            print(f"[PiGPIOController] {action_name} - Signal activated: R1:{True}, R2:{r2}, R3:{r3}, R4:{r4}.")
-            time.sleep(7)  # Maintain signal for 7 seconds
+        if self._stop_event.is_set():
+            self._abort_cycle(action_name)
+            return
+        self.all_relays_off()  # Reset all relays to low
+        self._record_cycle(self.clock.time() - cycle_start, acked)
+        print(f"[PiGPIOController] {action_name} - Relays deactivated. Sequence complete.")
 
-            self.all_relays_off()  # Reset all relays to low
-            print(f"[PiGPIOController] {action_name} - Relays deactivated. Sequence complete.")
+    def _hold_until_ack(self, initial_level):
+        """
+        Holds R1 until the ack pin leaves `initial_level` (sampled before R1 was
+        raised; at least hold_min_seconds), or falls back to the timed hold if no
+        ack arrives within ack_timeout_seconds. Returns True if acknowledged.
+        """
+        raised_at = self.clock.time()
+        if self.clock.wait(self._stop_event, self.hold_min_seconds):
+            return False
+        while self.clock.time() - raised_at < self.ack_timeout_seconds:
+            if self._ack_received(initial_level):
+                return True
+            if self.clock.wait(self._stop_event, 0.005):
+                return False
+        print("[PiGPIOController] No ack received. Falling back to the timed hold.")
+        self.clock.wait(self._stop_event, max(0.0, TIMED_HOLD_SECONDS - (self.clock.time() - raised_at)))
+        return False
+
+    def _read_ack_pin(self):
+        if self.ack_pin is None:
+            return self.get_ready_pin()
+        if not self.rpi_gpio_available:
+            return self._ack_pin_state
+        return GPIO.input(self.ack_pin)
 
-        threading.Thread(target=sequence).start()
+    def _ack_received(self, initial_level):
+        if self._read_ack_pin() != initial_level:
+            return True
+        # ack 走 ready_pin 時，上升緣事件也算（輪詢間隔內的短脈衝）
+        return self.ack_pin is None and self._ready_event.is_set()
+
+    def _abort_cycle(self, action_name):
+        """Releases the relays after stop() interrupted a cycle; it is not counted in the cycle times."""
+        self.all_relays_off()
+        with self._command_cond:
+            self.cycle_stats["aborted"] += 1
+        print(f"[PiGPIOController] {action_name} - Sequence aborted by stop; relays deactivated.")
+
+    def _record_cycle(self, seconds, acked):
+        with self._command_cond:
+            self._cycle_times.append(seconds)
+            self.cycle_stats["cycles"] += 1
+            if acked is True:
+                self.cycle_stats["acked"] += 1
+            elif acked is False:
+                self.cycle_stats["ack_timeouts"] += 1
+        print(f"[PiGPIOController] Cycle time: {seconds:.3f}s ({self.protocol_mode} protocol).")
+
+    def get_cycle_stats(self):
+        """Returns relay cycle-time statistics over the last 100 cycles (seconds) and picks per minute."""
+        with self._command_cond:
+            stats = dict(self.cycle_stats)
+            times = list(self._cycle_times)
+        stats["protocol_mode"] = self.protocol_mode
+        if times:
+            mean = sum(times) / len(times)
+            stats.update(last=times[-1], mean=mean, min=min(times), max=max(times), picks_per_minute=60.0 / mean)
+        return stats
+
+    def _enqueue_command(self, code, action_name):
+        with self._command_cond:
+            if self._stop_event.is_set():
+                print(f"[PiGPIOController] {action_name} ignored: controller is shutting down.")
+                return False
+            # 相同且尚未執行的指令直接合併，避免重複觸發
+            if any(pending_code == code for pending_code, _ in self._command_queue):
+                self.command_stats["coalesced"] += 1
+                print(f"[PiGPIOController] {action_name} already pending. Coalesced.")
+                return True
+            if len(self._command_queue) >= self.command_queue_size:
+                if self.queue_full_policy == "reject":
+                    self.command_stats["rejected"] += 1
+                    print(f"[PiGPIOController] Command queue full ({self.command_queue_size}). {action_name} rejected.")
+                    return False
+                dropped_code, dropped_name = self._command_queue.popleft()
+                self.command_stats["dropped"] += 1
+                print(f"[PiGPIOController] Command queue full. Dropped oldest pending command: {dropped_name}.")
+            self._command_queue.append((code, action_name))
+            self.command_stats["accepted"] += 1
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._worker_loop, name="PiGPIOActuator", daemon=True)
+                self._worker.start()
+            self._command_cond.notify()
+            return True
+
+    def _worker_loop(self):
+        while True:
+            with self._command_cond:
+                while not self._command_queue and not self._stop_event.is_set():
+                    self._command_cond.wait()
+                if self._stop_event.is_set():
+                    return
+                code, action_name = self._command_queue.popleft()
+                self._executing = action_name
+            try:
+                self._run_protocol_sequence(*code, action_name=action_name)
+            except Exception as e:
+                print(f"[PiGPIOController] Error while executing {action_name}: {e}")
+            with self._command_cond:
+                self._executing = None
+                self.command_stats["completed"] += 1
+                self._command_cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Blocks (in real time) until no relay sequence is pending or executing. Returns True if idle."""
+        with self._command_cond:
+            return self._command_cond.wait_for(
+                lambda: not self._command_queue and self._executing is None, timeout
+            )
+
+    def get_queue_depth(self):
+        """Returns the number of relay sequences waiting (not counting the one executing)."""
+        with self._command_cond:
+            return len(self._command_queue)
+
+    def get_command_stats(self):
+        """Returns command counters plus the current queue depth and executing action."""
+        with self._command_cond:
+            stats = dict(self.command_stats)
+            stats["queue_depth"] = len(self._command_queue)
+            stats["executing"] = self._executing
+            return stats
+
+    def _stop_worker(self):
+        with self._command_cond:
+            self._stop_event.set()
+            self._command_queue.clear()
+            self._command_cond.notify_all()
+        if self._worker and self._worker is not threading.current_thread():
+            self._worker.join(timeout=2)
+        self._worker = None
 
     def trigger_action_A(self): # Corresponds to Arduino 'A' -> 0001
-        self._execute_arm_sequence_with_protocol(False, False, True, "Action A (Encoded: 001)")
+        return self._execute_arm_sequence_with_protocol(False, False, True, "Action A (Encoded: 001)")
 
     def trigger_action_B(self): # Corresponds to Arduino 'B' -> 0010
-        self._execute_arm_sequence_with_protocol(False, True, False, "Action B (Encoded: 010)")
+        return self._execute_arm_sequence_with_protocol(False, True, False, "Action B (Encoded: 010)")
 
     def trigger_action_C(self): # Corresponds to Arduino 'C' -> 0011
-        self._execute_arm_sequence_with_protocol(False, True, True, "Action C (Encoded: 011)")
+        return self._execute_arm_sequence_with_protocol(False, True, True, "Action C (Encoded: 011)")
 
     def trigger_action_D(self): # Corresponds to Arduino 'D' -> 0100
-        self._execute_arm_sequence_with_protocol(True, False, False, "Action D (Encoded: 100)")
+        return self._execute_arm_sequence_with_protocol(True, False, False, "Action D (Encoded: 100)")
 
     def trigger_action_E(self): # Corresponds to Arduino 'E' -> 0101
-        self._execute_arm_sequence_with_protocol(True, False, True, "Action E (Encoded: 101)")
+        return self._execute_arm_sequence_with_protocol(True, False, True, "Action E (Encoded: 101)")
         
     def trigger_action_F(self): # Corresponds to Arduino 'F' -> 0110
-        self._execute_arm_sequence_with_protocol(True, True, False, "Action F (Encoded: 110)")
+        return self._execute_arm_sequence_with_protocol(True, True, False, "Action F (Encoded: 110)")
         
     def run_test_led_sequence(self):
         if not self.rpi_gpio_available or not self.led_pin:
@@ -185,21 +392,59 @@ class PiGPIOController:
         print("[PiGPIOController] Test LED sequence started...")
         for _ in range(3):
             GPIO.output(self.led_pin, GPIO.HIGH)
-            time.sleep(1)
+            self.clock.sleep(1)
             GPIO.output(self.led_pin, GPIO.LOW)
-            time.sleep(1)
+            self.clock.sleep(1)
         print("[PiGPIOController] Test LED sequence finished.")
 
     def cleanup(self):
+        self._stop_worker()
         if not self.rpi_gpio_available:
             print("[PiGPIOController] GPIO cleanup skipped (simulation mode).")
             return
         
         print("[PiGPIOController] Cleaning up GPIO resources...")
         self.all_relays_off() # Ensure all relays are off before cleaning up
+        if self._ready_edge_detection:
+            GPIO.remove_event_detect(self.ready_pin)
+            self._ready_edge_detection = False
         GPIO.cleanup()
         print("[PiGPIOController] GPIO cleanup complete.")
 
+    def _on_ready_edge(self, channel=None):
+        """Handles a ready_pin rising edge: wakes waiters and runs registered callbacks."""
+        self._ready_event.set()
+        for callback in list(self._ready_callbacks):
+            try:
+                callback()
+            except Exception as e:
+                print(f"[PiGPIOController] Error in ready callback: {e}")
+
+    def add_ready_callback(self, callback):
+        """Registers callback() to be called on every ready_pin rising edge."""
+        self._ready_callbacks.append(callback)
+
+    def wait_for_ready(self, timeout=None):
+        """
+        Blocks until ready_pin is HIGH or rises, or until `timeout` seconds pass.
+        Returns True if ready, False on timeout. Returns immediately if the pin is already HIGH.
+        """
+        self._ready_event.clear()
+        if self.get_ready_pin() == 1:
+            return True
+        if not self.rpi_gpio_available or self._ready_edge_detection:
+            return self.clock.wait(self._ready_event, timeout)
+        if self.ready_pin is None:
+            # Nothing can ever raise the pin; just honour the timeout
+            return self.clock.wait(self._ready_event, timeout)
+        # Hardware without edge detection: poll the pin
+        deadline = None if timeout is None else self.clock.time() + timeout
+        while deadline is None or self.clock.time() < deadline:
+            if self.get_ready_pin() == 1:
+                return True
+            self.clock.sleep(0.005)
+        return False
+
     def get_ready_pin(self):
         """取得 ready_pin 狀態，模擬時回傳 self._ready_pin_state"""
         if not self.rpi_gpio_available:
@@ -208,9 +453,16 @@ class PiGPIOController:
             return 0
         return GPIO.input(self.ready_pin)
 
+    def set_ack_pin_sim(self, value):
+        """僅模擬用，設定 ack_pin 狀態"""
+        self._ack_pin_state = 1 if value else 0
+
     def set_ready_pin_sim(self, value):
-        """僅模擬用，設定 ready_pin 狀態"""
+        """僅模擬用，設定 ready_pin 狀態（LOW->HIGH 時觸發與硬體相同的上升緣事件）"""
+        previous = self._ready_pin_state
         self._ready_pin_state = 1 if value else 0
+        if previous == 0 and self._ready_pin_state == 1:
+            self._on_ready_edge()
 
 if __name__ == '__main__':
     # This is for basic testing of the PiGPIOController class itself.
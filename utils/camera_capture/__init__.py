@@ -0,0 +1,2 @@
+# camera_capture package
+from .threaded_capture import ThreadedCapture, FramePacket, IDLE_POLICIES
@@ -0,0 +1,234 @@
+# utils/camera_capture/threaded_capture.py
+
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+# seq: 1-based frame counter, timestamp: time.time() right after the grab
+FramePacket = namedtuple("FramePacket", ["seq", "timestamp", "frame"])
+
+# Idle policies for set_idle():
+#   "off":   keep decoding every frame (no throttling)
+#   "grab":  only cap.grab() (drains the driver buffer, skips decode/retrieve)
+#   "pause": stop touching the camera until resume()
+IDLE_POLICIES = ("off", "grab", "pause")
+
+
+class ThreadedCapture:
+    """
+    Wraps a cv2.VideoCapture with a background grabber thread.
+
+    Only the newest frame is kept (older, unread frames are dropped), so the
+    consumer always processes the freshest image instead of whatever is queued
+    in the driver buffer. `read()`, `isOpened()`, `get()`, `set()` and
+    `release()` mirror cv2.VideoCapture so it can be used in its place; like
+    cv2.VideoCapture.read(), `read()` blocks until a frame arrives and only
+    returns (False, None) once the stream has ended.
+
+    While the application is idle (e.g. waiting for the ready pin) `set_idle()`
+    stops decoding frames; `resume()` flushes `flush_frames` possibly stale
+    frames from the driver buffer so the first frame read afterwards is fresh.
+    """
+
+    def __init__(self, cap, buffer_size=1, flush_frames=2):
+        self.cap = cap
+        self.lock = threading.Lock()
+        self.cap_lock = threading.Lock()  # serialises every call into the VideoCapture
+        self.new_frame = threading.Condition(self.lock)
+        self.packet = None          # latest FramePacket from the grabber
+        self.last_seq = 0           # seq of the last packet handed to the consumer
+        self.last_timestamp = None
+        self.frames_grabbed = 0
+        self.frames_dropped = 0     # grabbed frames the consumer never read
+        self.is_running = False
+        self.ended = False          # grabber hit a read failure (stream end / camera error)
+        self.thread = None
+        self.idle_policy = "off"
+        self.flush_frames = flush_frames
+        self.frames_skipped_idle = 0  # frames grabbed but never decoded while idle
+        self._flush_pending = 0
+        self.state_changed = threading.Condition(self.lock)
+        self._grabber_done = True
+        self._release_on_exit = False
+        if buffer_size is not None:
+            # Not every backend honours this; the grabber thread keeps up either way
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+    def start(self):
+        """Starts the grabber thread."""
+        if self.is_running:
+            return self
+        self.is_running = True
+        self.ended = False
+        self._grabber_done = False
+        self.thread = threading.Thread(target=self._grab_loop, name="ThreadedCapture", daemon=True)
+        self.thread.start()
+        return self
+
+    def set_idle(self, policy="grab"):
+        """Throttles the grabber while nobody needs frames (see IDLE_POLICIES)."""
+        if policy not in IDLE_POLICIES:
+            raise ValueError(f"Unknown idle policy: {policy}. Use one of {IDLE_POLICIES}.")
+        with self.lock:
+            if policy == self.idle_policy:
+                return
+            self.idle_policy = policy
+            self._flush_pending = 0
+            self.state_changed.notify_all()
+
+    def resume(self, flush_frames=None):
+        """
+        Leaves idle mode. Up to `flush_frames` frames queued in the driver are
+        grabbed and discarded first, and the frame held from before the idle
+        period is marked as read, so the next read() returns a fresh frame.
+        """
+        with self.lock:
+            was_idle = self.idle_policy != "off"
+            self.idle_policy = "off"
+            if was_idle:
+                self._flush_pending = self.flush_frames if flush_frames is None else flush_frames
+                if self.packet is not None:
+                    self.last_seq = self.packet.seq
+            self.state_changed.notify_all()
+
+    def _end_of_stream(self):
+        # caller holds self.lock
+        print("[ThreadedCapture] Can't receive frame (stream end or camera error?). Stopping grabber.")
+        self.ended = True
+        self.new_frame.notify_all()
+
+    def _grab_loop(self):
+        try:
+            self._grab_frames()
+        finally:
+            with self.lock:
+                self._grabber_done = True
+                release_now = self._release_on_exit
+            if release_now:
+                # release() 時仍卡在 cap.read()，由抓取執行緒結束後自行釋放
+                with self.cap_lock:
+                    self.cap.release()
+
+    def _grab_frames(self):
+        seq = 0
+        while self.is_running:
+            with self.lock:
+                # pause: 完全不碰相機，直到 resume()/stop()
+                while self.idle_policy == "pause" and self.is_running:
+                    self.state_changed.wait()
+                policy = self.idle_policy
+                flush = self._flush_pending
+                self._flush_pending = 0
+            if not self.is_running:
+                break
+
+            if policy == "grab" or flush:
+                # grab() 只取出影格不解碼；用於待機節流及恢復時清掉舊影格
+                grabbed = True
+                for _ in range(max(flush, 1)):
+                    with self.cap_lock:
+                        grabbed = self.cap.grab()
+                    if not grabbed:
+                        break
+                    self.frames_skipped_idle += 1
+                if not grabbed:
+                    with self.lock:
+                        self._end_of_stream()
+                    break
+                if policy == "grab":
+                    continue
+
+            with self.cap_lock:
+                ret, frame = self.cap.read()
+            timestamp = time.time()
+            with self.lock:
+                if not ret:
+                    self._end_of_stream()
+                    break
+                seq += 1
+                if self.packet is not None and self.packet.seq > self.last_seq:
+                    self.frames_dropped += 1
+                self.packet = FramePacket(seq, timestamp, frame)
+                self.frames_grabbed = seq
+                self.new_frame.notify_all()
+
+    def read_packet(self, timeout=None):
+        """
+        Returns the newest FramePacket not yet read, waiting for one (at most
+        `timeout` seconds if given). Returns None if the grabber stopped or
+        the timeout expired; `ended` tells the two apart.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self.lock:
+            while self.packet is None or self.packet.seq <= self.last_seq:
+                if self.ended or not self.is_running:
+                    return None
+                if deadline is None:
+                    self.new_frame.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.new_frame.wait(remaining)
+            packet = self.packet
+            self.last_seq = packet.seq
+            self.last_timestamp = packet.timestamp
+            return packet
+
+    def read(self, timeout=None):
+        """
+        cv2.VideoCapture-style read: returns (ret, frame) for the newest unread
+        frame, blocking until there is one. ret is False at end of stream (or
+        when an explicit `timeout` expires).
+        """
+        packet = self.read_packet(timeout)
+        if packet is None:
+            return False, None
+        return True, packet.frame
+
+    def isOpened(self):
+        with self.cap_lock:
+            opened = self.cap is not None and self.cap.isOpened()
+        return opened and not self.ended
+
+    def get(self, prop_id):
+        with self.cap_lock:
+            return self.cap.get(prop_id)
+
+    def set(self, prop_id, value):
+        with self.cap_lock:
+            return self.cap.set(prop_id, value)
+
+    def stop(self, timeout=2.0):
+        """
+        Stops the grabber thread without releasing the device. Returns False
+        if the thread is still blocked in the camera after `timeout` seconds.
+        """
+        self.is_running = False
+        with self.lock:
+            self.new_frame.notify_all()
+            self.state_changed.notify_all()
+        thread = self.thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+        if thread is not None and thread.is_alive():
+            return False
+        self.thread = None
+        return True
+
+    def release(self):
+        """Stops the grabber and releases the camera once the grabber has exited."""
+        self.stop()
+        if self.cap is None:
+            return
+        with self.lock:
+            release_now = self._grabber_done
+            if not release_now:
+                self._release_on_exit = True
+        if release_now:
+            with self.cap_lock:
+                self.cap.release()
+        else:
+            print("[ThreadedCapture] Grabber still blocked in the camera; it will release the device when it returns.")
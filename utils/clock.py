@@ -0,0 +1,84 @@
+# utils/clock.py
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class SystemClock:
+    """Real wall-clock time; the default clock everywhere."""
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait(self, event, timeout=None):
+        """Waits for a threading.Event like event.wait(timeout)."""
+        return event.wait(timeout)
+
+
+class SimulatedClock:
+    """
+    Virtual clock for tests and simulations: sleep() and wait() return
+    immediately and advance the virtual time instead of blocking.
+
+    Callbacks registered with schedule() run when the virtual time passes
+    their due time, which is how simulated peripherals (e.g. an Arduino
+    acknowledging a relay code after 150 ms) are modelled.
+    """
+
+    def __init__(self, start=0.0):
+        self._now = float(start)
+        self._lock = threading.RLock()
+        self._scheduled = []
+        self._counter = itertools.count()
+
+    def time(self):
+        with self._lock:
+            return self._now
+
+    def schedule(self, delay, callback):
+        """Runs callback() once the virtual time has advanced by `delay` seconds."""
+        with self._lock:
+            heapq.heappush(self._scheduled, (self._now + max(0.0, delay), next(self._counter), callback))
+
+    def advance(self, seconds):
+        """Moves the virtual time forward, running due callbacks in order."""
+        with self._lock:
+            target = self._now + max(0.0, seconds)
+            while self._scheduled and self._scheduled[0][0] <= target:
+                due, _, callback = heapq.heappop(self._scheduled)
+                self._now = max(self._now, due)
+                callback()
+            self._now = target
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def wait(self, event, timeout=None):
+        """
+        Returns immediately if the event is set. Otherwise advances the virtual
+        time by `timeout` (scheduled callbacks may set the event on the way).
+        With timeout=None it blocks in real time, like event.wait().
+        """
+        if event.is_set():
+            return True
+        if timeout is None:
+            return event.wait()
+        with self._lock:
+            target = self._now + max(0.0, timeout)
+            while self._scheduled and self._scheduled[0][0] <= target and not event.is_set():
+                due, _, callback = heapq.heappop(self._scheduled)
+                self._now = max(self._now, due)
+                callback()
+            if not event.is_set():
+                self._now = target
+        return event.is_set()
+
+
+# Shared default instance
+system_clock = SystemClock()
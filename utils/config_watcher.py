@@ -0,0 +1,166 @@
+# utils/config_watcher.py
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# Finished writes, atomic replaces (rename into place) and removals
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _load_inotify():
+    """Returns libc if it provides inotify, else None."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+class ConfigWatcher:
+    """
+    Calls `callback(path)` from a background thread whenever one of `paths`
+    changes, keeping file checks out of the capture loop.
+
+    The containing directories are watched with Linux inotify, so saves that
+    replace the file (os.replace / editors' rename) and deletions are seen
+    too; where inotify is unavailable the files' mtime/size are polled every
+    `poll_interval` seconds. Events are debounced: the callback runs once a
+    file has been quiet for `debounce` seconds, i.e. after the writer is done.
+    """
+
+    def __init__(self, paths, callback, debounce=0.01, poll_interval=1.0, use_inotify=True):
+        self.paths = {os.path.abspath(str(p)) for p in paths}
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.backend = None           # "inotify" or "polling" once started
+        self.events_delivered = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._fd = None
+        self._watch_dirs = {}         # wd -> directory
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stop_event.clear()
+        if self.use_inotify and self._init_inotify():
+            self.backend = "inotify"
+            target = self._run_inotify
+        else:
+            self.backend = "polling"
+            target = self._run_polling
+        print(f"[ConfigWatcher] Watching {sorted(self.paths)} ({self.backend}).")
+        self._thread = threading.Thread(target=target, name="ConfigWatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _init_inotify(self):
+        libc = _load_inotify()
+        if libc is None:
+            return False
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            print(f"[ConfigWatcher] inotify_init1 failed (errno {ctypes.get_errno()}), falling back to polling.")
+            return False
+        for directory in {os.path.dirname(p) for p in self.paths}:
+            wd = libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                print(f"[ConfigWatcher] Cannot watch {directory} (errno {ctypes.get_errno()}), falling back to polling.")
+                os.close(fd)
+                self._watch_dirs = {}
+                return False
+            self._watch_dirs[wd] = directory
+        self._fd = fd
+        return True
+
+    def _deliver(self, path):
+        try:
+            self.callback(path)
+            self.events_delivered += 1
+        except Exception as e:
+            print(f"[ConfigWatcher] Error handling change of {path}: {e}")
+
+    def _fire_due(self, pending):
+        now = time.monotonic()
+        for path, due in list(pending.items()):
+            if due <= now:
+                del pending[path]
+                self._deliver(path)
+
+    def _run_inotify(self):
+        pending = {}  # path -> time the debounce window ends
+        while not self._stop_event.is_set():
+            if pending:
+                timeout = max(0.0, min(pending.values()) - time.monotonic())
+            else:
+                timeout = 0.2  # 只為了定期檢查 stop
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+            if readable:
+                try:
+                    data = os.read(self._fd, 64 * 1024)
+                except BlockingIOError:
+                    data = b""
+                offset = 0
+                while offset + _EVENT_HEADER.size <= len(data):
+                    wd, mask, cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                    offset += _EVENT_HEADER.size
+                    name = data[offset:offset + name_len].split(b"\0", 1)[0]
+                    offset += name_len
+                    directory = self._watch_dirs.get(wd)
+                    if directory is None or not name:
+                        continue
+                    path = os.path.join(directory, os.fsdecode(name))
+                    if path in self.paths:
+                        pending[path] = time.monotonic() + self.debounce
+            self._fire_due(pending)
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _run_polling(self):
+        last = {path: self._stat(path) for path in self.paths}
+        while not self._stop_event.wait(self.poll_interval):
+            for path in self.paths:
+                current = self._stat(path)
+                if current == last[path]:
+                    continue
+                # 等檔案在 debounce 時間內不再變動（寫入完成）才通知
+                while not self._stop_event.wait(self.debounce):
+                    settled = self._stat(path)
+                    if settled == current:
+                        break
+                    current = settled
+                last[path] = current
+                self._deliver(path)
@@ -2,24 +2,109 @@ import cv2
 import subprocess
 import numpy as np
 import time
+import threading
+import re
+from collections import deque
+
+DROP_POLICIES = ("drop_oldest", "drop_newest")
+# Raw pixel formats accepted on FFmpeg's stdin: bgr24 is 3 bytes/pixel,
+# the 4:2:0 formats (converted in OpenCV) are 1.5 bytes/pixel.
+PIXEL_FORMATS = ("bgr24", "yuv420p", "nv12")
+
+# Matches the key=value pairs of FFmpeg progress lines, e.g.
+# "frame=  120 fps= 25 q=28.0 size=  512kB time=00:00:04.80 bitrate= 873.8kbits/s dup=0 drop=2 speed=0.99x"
+_PROGRESS_FIELD_RE = re.compile(r"(\w+)=\s*(\S+)")
+_NUMBER_RE = re.compile(r"^[-+]?\d+(?:\.\d+)?")
+_BITRATE_SCALE = {"kbits/s": 1.0, "mbits/s": 1000.0, "bits/s": 0.001}
+
+def _parse_number(value):
+    match = _NUMBER_RE.match(value)
+    return float(match.group(0)) if match else None
+
+def parse_ffmpeg_progress(line):
+    """
+    Parses an FFmpeg progress line into a dict with frame, fps, bitrate_kbps,
+    dup, drop and speed. Returns None for lines that are not progress lines.
+    """
+    fields = dict(_PROGRESS_FIELD_RE.findall(line))
+    if "frame" not in fields or "fps" not in fields:
+        return None
+    stats = {"fps": _parse_number(fields["fps"])}
+    for key in ("frame", "dup", "drop"):
+        if key in fields:
+            number = _parse_number(fields[key])
+            stats[key] = int(number) if number is not None else None
+    if "speed" in fields:
+        stats["speed"] = _parse_number(fields["speed"])
+    if "bitrate" in fields:
+        bitrate = _parse_number(fields["bitrate"])
+        unit = fields["bitrate"].lstrip("+-0123456789.")
+        stats["bitrate_kbps"] = bitrate * _BITRATE_SCALE[unit] if bitrate is not None and unit in _BITRATE_SCALE else None
+    return stats
 
 class RTSPPusher:
-    def __init__(self, rtsp_url, width=640, height=480, fps=20):
+    def __init__(self, rtsp_url, width=640, height=480, fps=20, async_mode=False, queue_size=2, drop_policy="drop_oldest", stderr_history=100, pixel_format="bgr24"):
+        """
+        :param async_mode: If True, push_frame only enqueues the frame; a writer
+                           thread resizes and writes it to FFmpeg.
+        :param queue_size: Maximum number of frames waiting for the writer (async mode).
+        :param drop_policy: What to do when the queue is full: "drop_oldest" discards
+                            the oldest queued frame, "drop_newest" discards the incoming one.
+        :param stderr_history: Number of recent FFmpeg stderr lines kept for crash diagnosis.
+        :param pixel_format: Raw format sent over the pipe: "bgr24", "yuv420p" (I420) or "nv12".
+                             The 4:2:0 formats halve pipe throughput and require even width/height.
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"drop_policy must be one of {DROP_POLICIES}, got {drop_policy!r}")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1.")
+        if pixel_format not in PIXEL_FORMATS:
+            raise ValueError(f"pixel_format must be one of {PIXEL_FORMATS}, got {pixel_format!r}")
+        if pixel_format != "bgr24" and (width % 2 or height % 2):
+            raise ValueError(f"{pixel_format} requires an even width and height, got {width}x{height}.")
         self.rtsp_url = rtsp_url
         self.width = width
         self.height = height
         self.fps = fps
+        self.pixel_format = pixel_format
+        self.yuv_buffer = None  # reused I420 conversion output
+        self.nv12_buffer = None # reused NV12 output (Y plane + interleaved UV)
         self.process = None
+        self.async_mode = async_mode
+        self.drop_policy = drop_policy
+        self.frame_queue = deque()
+        self.queue_size = queue_size
+        self.queue_cond = threading.Condition()
+        self.writer_thread = None
+        self.writer_running = False
+        self.frames_enqueued = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        # FFmpeg stderr is drained continuously so the pipe can never fill up and block FFmpeg
+        self.stderr_thread = None
+        self.stderr_lines = deque(maxlen=stderr_history)
+        self.stats_lock = threading.Lock()
+        self.encoder_stats = {}
         print(f"[RTSPPusher] Initializing for RTSP URL: {self.rtsp_url}, Resolution: {self.width}x{self.height}, FPS: {self.fps}")
         self._start_ffmpeg()
+        if self.async_mode:
+            self._start_writer()
+            print(f"[RTSPPusher] Async mode: queue_size={self.queue_size}, drop_policy={self.drop_policy}")
 
-    def _start_ffmpeg(self):
-        command = [
+    def _output_args(self):
+        return [
+            '-f', 'rtsp',
+            '-rtsp_transport', 'tcp', # Prefer TCP for reliability
+            self.rtsp_url
+        ]
+
+    def _build_ffmpeg_command(self):
+        return [
             'ffmpeg',
             '-y',  # Overwrite output files without asking
             '-f', 'rawvideo',
             '-vcodec', 'rawvideo',
-            '-pix_fmt', 'bgr24',  # OpenCV uses BGR
+            '-pix_fmt', self.pixel_format,  # bgr24 is OpenCV's native BGR layout
             '-s', f'{self.width}x{self.height}',
             '-r', str(self.fps),
             '-i', '-',  # Input from stdin
@@ -28,15 +113,19 @@ class RTSPPusher:
             '-preset', 'veryfast', # Changed from ultrafast
             '-b:v', '1M', # Added bitrate limit to 1 Mbps, adjust as needed
             '-tune', 'zerolatency',
-            '-f', 'rtsp',
-            '-rtsp_transport', 'tcp', # Prefer TCP for reliability
-            self.rtsp_url
-        ]
+        ] + self._output_args()
+
+    def _start_ffmpeg(self):
+        command = self._build_ffmpeg_command()
         try:
             # Using stderr=subprocess.PIPE to capture FFmpeg errors
             self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
             print(f"FFmpeg process starting for RTSP stream: {self.rtsp_url}")
             print(f"FFmpeg command: {' '.join(command)}")
+            self.stderr_thread = threading.Thread(
+                target=self._stderr_loop, args=(self.process.stderr,), name="RTSPPusherStderr", daemon=True
+            )
+            self.stderr_thread.start()
         except FileNotFoundError:
             print("Error: ffmpeg command not found. Please ensure FFmpeg is installed and in your PATH.")
             self.process = None
@@ -44,14 +133,129 @@ class RTSPPusher:
             print(f"Error starting FFmpeg: {e}")
             self.process = None
 
+    def _stderr_loop(self, stream):
+        """Drains FFmpeg stderr, keeping recent lines and the latest progress statistics."""
+        pending = b""
+        while True:
+            try:
+                chunk = stream.read1(4096)
+            except (ValueError, OSError):
+                break  # stream closed
+            if not chunk:
+                break
+            # Progress lines end with '\r', messages with '\n'
+            parts = re.split(rb"[\r\n]", pending + chunk)
+            pending = parts.pop()
+            for raw in parts:
+                self._handle_stderr_line(raw)
+        if pending:
+            self._handle_stderr_line(pending)
+
+    def _handle_stderr_line(self, raw):
+        line = raw.decode("utf-8", errors="ignore").strip()
+        if not line:
+            return
+        progress = parse_ffmpeg_progress(line)
+        with self.stats_lock:
+            self.stderr_lines.append(line)
+            if progress:
+                progress["updated_at"] = time.time()
+                self.encoder_stats = progress
+
+    def get_encoder_stats(self):
+        """Returns the latest parsed FFmpeg progress (fps, speed, bitrate_kbps, dup, drop, frame)."""
+        with self.stats_lock:
+            return dict(self.encoder_stats)
+
+    def get_recent_stderr(self):
+        """Returns the most recent FFmpeg stderr lines (oldest first)."""
+        with self.stats_lock:
+            return list(self.stderr_lines)
+
+    def _start_writer(self):
+        self.writer_running = True
+        self.writer_thread = threading.Thread(target=self._writer_loop, name="RTSPPusherWriter", daemon=True)
+        self.writer_thread.start()
+
+    def _stop_writer(self):
+        if not self.writer_thread:
+            return
+        with self.queue_cond:
+            self.writer_running = False
+            self.queue_cond.notify_all()
+        self.writer_thread.join(timeout=5)
+        self.writer_thread = None
+
+    def _writer_loop(self):
+        while True:
+            with self.queue_cond:
+                while not self.frame_queue and self.writer_running:
+                    self.queue_cond.wait()
+                if not self.writer_running:
+                    break
+                frame = self.frame_queue.popleft()
+            self._write_frame(frame)
+
     def push_frame(self, frame):
+        """
+        Sends a frame to FFmpeg. In async mode this only inserts the frame into
+        the bounded queue (applying the drop policy) and returns immediately.
+        """
+        if not self.async_mode:
+            self._write_frame(frame)
+            return
+        if frame is None:
+            print("Received an empty frame. Skipping.")
+            return
+        with self.queue_cond:
+            if len(self.frame_queue) >= self.queue_size:
+                self.frames_dropped += 1
+                if self.drop_policy == "drop_newest":
+                    return
+                self.frame_queue.popleft()
+            self.frame_queue.append(frame)
+            self.frames_enqueued += 1
+            self.queue_cond.notify()
+
+    def get_stats(self):
+        """Returns the push counters and current queue depth."""
+        with self.queue_cond:
+            return {
+                "frames_enqueued": self.frames_enqueued,
+                "frames_written": self.frames_written,
+                "frames_dropped": self.frames_dropped,
+                "queue_depth": len(self.frame_queue),
+                "encoder": self.get_encoder_stats(),
+            }
+
+    def _convert_frame(self, frame):
+        """Resizes (only if needed) and converts a BGR frame to the pipe's pixel format."""
+        if frame.shape[1] != self.width or frame.shape[0] != self.height:
+            frame = cv2.resize(frame, (self.width, self.height))
+        if self.pixel_format == "bgr24":
+            return np.ascontiguousarray(frame)
+        self.yuv_buffer = cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420, dst=self.yuv_buffer)
+        if self.pixel_format == "yuv420p":
+            return self.yuv_buffer
+        # OpenCV has no direct BGR->NV12 conversion: interleave the I420 chroma planes
+        h, w = self.height, self.width
+        if self.nv12_buffer is None:
+            self.nv12_buffer = np.empty((h * 3 // 2, w), dtype=np.uint8)
+        self.nv12_buffer[:h] = self.yuv_buffer[:h]
+        chroma = self.yuv_buffer[h:].reshape(2, h // 2, w // 2)
+        uv = self.nv12_buffer[h:].reshape(h // 2, w // 2, 2)
+        uv[..., 0] = chroma[0]
+        uv[..., 1] = chroma[1]
+        return self.nv12_buffer
+
+    def _write_frame(self, frame):
         if not self.process or self.process.stdin is None:
             # Check if the process has terminated
             if self.process and self.process.poll() is not None:
                 print("FFmpeg process has terminated. Attempting to read stderr...")
                 self._handle_ffmpeg_errors() # Read errors from terminated process
                 print("Attempting to restart FFmpeg...")
-                self.release() # Clean up existing process before restarting
+                self._stop_ffmpeg() # Clean up existing process before restarting
                 self._start_ffmpeg() # Restart FFmpeg
                 if not self.process or self.process.stdin is None:
                     print("Failed to restart FFmpeg. Cannot push frame.")
@@ -65,30 +269,34 @@ class RTSPPusher:
             return
 
         try:
-            resized_frame = cv2.resize(frame, (self.width, self.height))
-            self.process.stdin.write(resized_frame.tobytes())
+            # memoryview avoids the extra copy made by tobytes()
+            self.process.stdin.write(memoryview(self._convert_frame(frame)).cast("B"))
             self.process.stdin.flush() # Ensure data is sent immediately
+            with self.queue_cond:  # get_stats() reads the counters under the same lock
+                self.frames_written += 1
         except BrokenPipeError:
             print("BrokenPipeError: FFmpeg process may have terminated unexpectedly.")
             self._handle_ffmpeg_errors()
             print("Attempting to restart FFmpeg due to BrokenPipeError...")
-            self.release()
+            self._stop_ffmpeg()
             self._start_ffmpeg()
         except Exception as e:
             print(f"Error writing frame to FFmpeg: {e}")
             # You might want to add more specific error handling or restart logic here
 
     def _handle_ffmpeg_errors(self):
-        if self.process and self.process.stderr:
-            try:
-                # Non-blocking read if possible, or ensure this doesn't hang
-                ffmpeg_errors = self.process.stderr.read()
-                if ffmpeg_errors:
-                    print(f"FFmpeg stderr output:\n{ffmpeg_errors.decode('utf-8', errors='ignore')}")
-            except Exception as e:
-                print(f"Error reading FFmpeg stderr: {e}")
+        # stderr is owned by the reader thread; report what it has collected
+        if self.stderr_thread:
+            self.stderr_thread.join(timeout=1)
+        recent = self.get_recent_stderr()
+        if recent:
+            print("FFmpeg stderr output (most recent lines):\n" + "\n".join(recent))
 
     def release(self):
+        self._stop_writer()
+        self._stop_ffmpeg()
+
+    def _stop_ffmpeg(self):
         if self.process:
             print("Stopping FFmpeg process...")
             if self.process.stdin:
@@ -97,7 +305,11 @@ class RTSPPusher:
                 except Exception as e:
                     print(f"Error closing FFmpeg stdin: {e}")
             
-            # Read any remaining stderr output before terminating
+            # Let FFmpeg flush and exit, then report its remaining stderr output
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                pass
             self._handle_ffmpeg_errors()
 
             if self.process.poll() is None:  # Check if process is still running
@@ -121,6 +333,10 @@ class RTSPPusher:
             else:
                 print(f"FFmpeg process already terminated with code: {self.process.poll()}")
 
+            if self.stderr_thread:
+                self.stderr_thread.join(timeout=1)
+                self.stderr_thread = None
+
             if self.process.stderr: # Ensure stderr is closed
                  try:
                     self.process.stderr.close()
@@ -0,0 +1,93 @@
+# utils/vision_processing/compiled_config.py
+
+import threading
+from types import MappingProxyType
+
+import numpy as np
+
+
+def _readonly(array):
+    array.flags.writeable = False
+    return array
+
+
+class CompiledColorConfig:
+    """
+    Immutable, preconverted color configuration used by the detection loop.
+
+    Holds the HSV bounds as read-only NumPy arrays, the morphology kernel, the
+    (color, shape) -> action map and the minimum component area, tagged with a
+    version number. A new object is built whenever the configuration changes,
+    so consumers can keep a reference without copying or converting per frame.
+    """
+
+    def __init__(self, color_ranges, action_map, min_component_area, version=0, kernel_size=(2, 2)):
+        bounds = {}
+        for name, (lower, upper) in color_ranges.items():
+            bounds[name] = (
+                _readonly(np.clip(np.asarray(lower, dtype=np.int32), 0, 255).astype(np.uint8)),
+                _readonly(np.clip(np.asarray(upper, dtype=np.int32), 0, 255).astype(np.uint8)),
+            )
+        self.version = version
+        self.names = tuple(bounds)
+        self.bounds = MappingProxyType(bounds)
+        self.kernel = _readonly(np.ones(kernel_size, np.uint8))
+        self.action_map = MappingProxyType(dict(action_map))
+        self.min_component_area = min_component_area
+        # Hashable form of the bounds (used e.g. by the lookup-table segmenter)
+        self.ranges_key = tuple(
+            (name, tuple(int(v) for v in lower), tuple(int(v) for v in upper))
+            for name, (lower, upper) in bounds.items()
+        )
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("CompiledColorConfig is immutable; build a new one instead.")
+        object.__setattr__(self, name, value)
+
+    def to_dict(self):
+        """Plain {color: [[h, s, v], [h, s, v]]} form, as stored in color_config.json."""
+        return {name: [lower.tolist(), upper.tolist()] for name, (lower, upper) in self.bounds.items()}
+
+    def __repr__(self):
+        return f"CompiledColorConfig(version={self.version}, colors={list(self.names)})"
+
+
+class ColorConfigHolder:
+    """
+    Single atomic reference to the current CompiledColorConfig.
+
+    `update()` compiles the new ranges outside the hot loop and publishes them
+    by swapping `current` in one assignment; readers just use `holder.current`
+    (or keep the object they got) and never see a half-updated config.
+    `min_component_area` may be a callable returning the current value, so a
+    tuned area (config.min_component_area) is picked up on the next update.
+    """
+
+    def __init__(self, action_map, min_component_area, color_ranges=None):
+        self.action_map = action_map
+        self.min_component_area = min_component_area
+        self._lock = threading.Lock()  # serialises writers only
+        self._version = 0
+        self.current = None
+        if color_ranges is not None:
+            self.update(color_ranges)
+
+    def update(self, color_ranges):
+        """Compiles `color_ranges` and makes it the current config; returns it."""
+        with self._lock:
+            self._version += 1
+            min_area = self.min_component_area
+            if callable(min_area):
+                min_area = min_area()  # 每次編譯時讀取目前的值，而非建構時的快照
+            compiled = CompiledColorConfig(
+                color_ranges, self.action_map, min_area, version=self._version
+            )
+            self.current = compiled
+        return compiled
+
+    @property
+    def version(self):
+        current = self.current
+        return current.version if current is not None else 0
@@ -1,14 +1,22 @@
 # utils/vision_processing/confidence_scorer.py
 
 import cv2
+from .contour_features import MIN_CONTOUR_AREA, density
 
-def compute_confidence(cnt, approx, hsv_mask, shape):
-    area = cv2.contourArea(cnt)
-    if area < 1000:
+def compute_confidence(cnt, approx, hsv_mask, shape, features=None):
+    # features: ContourFeatures from contour_features.extract_features (avoids recomputing)
+    if features is not None:
+        area = features.area
+        x, y, w, h = features.box
+        aspect_ratio = features.aspect_ratio
+    else:
+        area = cv2.contourArea(cnt)
+    if area < MIN_CONTOUR_AREA:
         return 0.0
 
-    x, y, w, h = cv2.boundingRect(approx)
-    aspect_ratio = w / h if h != 0 else 0
+    if features is None:
+        x, y, w, h = cv2.boundingRect(approx)
+        aspect_ratio = w / h if h != 0 else 0
 
     # Shape score
     if shape == "Square":
@@ -19,9 +27,7 @@ def compute_confidence(cnt, approx, hsv_mask, shape):
         shape_score = 0.3
 
     # Mask density score
-    mask_crop = hsv_mask[y:y+h, x:x+w]
-    mask_area = cv2.countNonZero(mask_crop)
-    density_score = mask_area / (w * h + 1)
+    density_score = density((x, y, w, h), hsv_mask)
 
     # Total score (you can adjust weights)
     total_score = 0.6 * shape_score + 0.4 * density_score
@@ -1,11 +1,21 @@
 # utils/vision_processing/config.py
 
+import atexit
 import json
+from copy import deepcopy
 from pathlib import Path
 
+from .work_zone import WorkZone
+from .compiled_config import ColorConfigHolder
+from .config_writer import ConfigWriter
+
 # Path to the configuration file
 # RENAME CONFIG_FILE_PATH to COLOR_CONFIG_PATH for consistency with main_stream.py import
 COLOR_CONFIG_PATH = Path(__file__).parent / "color_config.json"
+# Work zone (static processing ROI) is stored next to the color config
+WORK_ZONE_CONFIG_PATH = Path(__file__).parent / "work_zone.json"
+# Previous versions of the config files (kept by config_writer for rollback)
+CONFIG_HISTORY_DIR = Path(__file__).parent / "config_history"
 
 # Global variable to hold color ranges, initialized by load_color_ranges
 color_ranges = {}
@@ -17,6 +27,9 @@ DEFAULT_COLOR_RANGES = {
     "Green": [[40, 100, 100], [80, 255, 255]],  # 新增
 }
 
+# Connected components smaller than this (in pixels) are treated as noise
+min_component_area = 300  # 根據實際情況調整
+
 #更改
 # color + shape -> corresponding control command
 action_map = {
@@ -28,6 +41,13 @@ action_map = {
     ('Green', 'Square'): 'F',     # 新增
 }
 
+# Compiled (NumPy, versioned) form of color_ranges; swapped atomically on load/save
+active_color_config = ColorConfigHolder(action_map, lambda: min_component_area)  # 讀取目前的模組值
+
+# 儲存在背景執行緒以原子方式寫入，連續多次儲存只寫最後一次
+config_writer = ConfigWriter(CONFIG_HISTORY_DIR)
+atexit.register(config_writer.stop)
+
 def load_color_ranges():
     """Loads color ranges from the JSON configuration file."""
     global color_ranges
@@ -46,17 +66,107 @@ def load_color_ranges():
     else:
         print(f"[Config] Warning: Configuration file {COLOR_CONFIG_PATH} not found. Initializing empty color ranges.") # Use the renamed variable
         color_ranges = {}
+    active_color_config.update(color_ranges)
     return color_ranges
 
-def save_color_ranges(new_ranges):
-    """Saves the given color ranges to the JSON configuration file."""
+def save_color_ranges(new_ranges, wait=False):
+    """
+    Saves the given color ranges to the JSON configuration file.
+    The in-memory config is updated immediately; the file is written atomically
+    by the background writer (`wait=True` blocks until it is on disk).
+    Returns the writer token (see config_save_status), or None if nothing was saved.
+    """
     global color_ranges
     try:
-        with open(COLOR_CONFIG_PATH, "w", encoding="utf-8") as f: # Use the renamed variable
-            json.dump(new_ranges, f, indent=4)
-        color_ranges = new_ranges # Update the global variable as well
-        print(f"[Config] Color ranges saved to {COLOR_CONFIG_PATH}") # Use the renamed variable
+        snapshot = validate_color_ranges(deepcopy(new_ranges))  # 呼叫端之後可能繼續修改 new_ranges
+    except ValueError as e:
+        print(f"[Config] Not saving invalid color ranges: {e}")
+        return None
+    color_ranges = snapshot # Update the global variable as well
+    active_color_config.update(color_ranges)
+    token = config_writer.submit(COLOR_CONFIG_PATH, snapshot)
+    print(f"[Config] Color ranges queued for saving to {COLOR_CONFIG_PATH}")
+    if wait:
+        config_writer.flush()
+    return token
+
+def validate_color_ranges(data):
+    """Raises ValueError unless `data` has the {color: [[h, s, v], [h, s, v]]} form."""
+    if not isinstance(data, dict):
+        raise ValueError(f"expected an object of color ranges, got {type(data).__name__}")
+    for name, bounds in data.items():
+        if (not isinstance(bounds, (list, tuple)) or len(bounds) != 2
+                or any(not isinstance(b, (list, tuple)) or len(b) != 3 for b in bounds)
+                or any(not isinstance(v, (int, float)) or isinstance(v, bool) for b in bounds for v in b)):
+            raise ValueError(f"invalid range for '{name}': {bounds!r}")
+    return data
+
+def read_color_ranges(path=COLOR_CONFIG_PATH):
+    """
+    Reads and validates a color config file without touching the module state.
+    Raises OSError/ValueError (incl. JSONDecodeError) so callers can keep the previous config.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return validate_color_ranges(json.load(f))
+
+def load_work_zone():
+    """Loads the work zone from its JSON file; returns a WorkZone or None (whole frame)."""
+    if not WORK_ZONE_CONFIG_PATH.exists():
+        return None
+    try:
+        with open(WORK_ZONE_CONFIG_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not data:
+            return None
+        zone = WorkZone.from_dict(data)
+        print(f"[Config] Work zone loaded from {WORK_ZONE_CONFIG_PATH}: {zone.rect}")
+        return zone
+    except (json.JSONDecodeError, TypeError, ValueError) as e:
+        print(f"[Config] Error decoding work zone from {WORK_ZONE_CONFIG_PATH}: {e}")
     except Exception as e:
-        print(f"[Config] Error saving color ranges to {COLOR_CONFIG_PATH}: {e}") # Use the renamed variable
+        print(f"[Config] Error loading {WORK_ZONE_CONFIG_PATH}: {e}")
+    return None
+
+def save_work_zone(zone, wait=False):
+    """
+    Saves the work zone (a WorkZone, or None to process the whole frame) via
+    the background writer; returns the writer token.
+    """
+    token = config_writer.submit(WORK_ZONE_CONFIG_PATH, zone.to_dict() if zone is not None else None)
+    if zone is None:
+        print(f"[Config] Work zone cleared ({WORK_ZONE_CONFIG_PATH} will be removed)")
+    else:
+        print(f"[Config] Work zone queued for saving to {WORK_ZONE_CONFIG_PATH}")
+    if wait:
+        config_writer.flush()
+    return token
+
+def config_save_status(token):
+    """Non-blocking: None while the save of `token` is queued, True once on disk, False if it failed."""
+    return config_writer.status(token)
+
+def flush_config_writes(timeout=None):
+    """Blocks until every queued config save is on disk."""
+    return config_writer.flush(timeout)
+
+def rollback_color_ranges(steps=1):
+    """
+    Restores the color ranges saved `steps` versions ago from the history and
+    makes them current; returns them, or None if there is no such version.
+    """
+    global color_ranges
+    try:
+        ranges = config_writer.rollback(COLOR_CONFIG_PATH, steps, validate=validate_color_ranges)
+    except (OSError, ValueError) as e:
+        print(f"[Config] Cannot roll back color ranges {steps} step(s): {e}")
+        return None
+    if ranges is None:
+        print(f"[Config] No color config history entry {steps}.")
+        return None
+    color_ranges = ranges
+    active_color_config.update(color_ranges)
+    print(f"[Config] Color ranges rolled back {steps} step(s).")
+    return color_ranges
+
 # Initialize color_ranges when the module is imported
 load_color_ranges()
@@ -0,0 +1,204 @@
+# utils/vision_processing/config_writer.py
+"""
+Atomic, coalescing JSON persistence for the config files.
+
+Roll the color config back one save (a running main_stream picks it up):
+    python -c "from utils.vision_processing.config import rollback_color_ranges; rollback_color_ranges(1)"
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+
+def atomic_write_json(path, data, indent=4):
+    """
+    Writes `data` to a temp file next to `path`, fsyncs it and renames it over
+    `path`, so readers see either the old or the new file, never a partial one.
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # 確保 rename 本身也落盤
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class ConfigWriter:
+    """
+    Background writer for JSON config files.
+
+    `submit()` only records the latest data per path and returns; a daemon
+    thread writes it once no new save arrived for `coalesce_delay` seconds, so
+    a burst of saves costs a single write. Every write is atomic (see
+    atomic_write_json). Before a file is replaced or removed its previous
+    content is copied to `history_dir` (newest `history_size` kept per file)
+    for `rollback()`.
+
+    Each `submit()` returns a token; `status(token)` tells the caller, without
+    blocking, whether that save (or a later one that replaced it) is on disk.
+    """
+
+    def __init__(self, history_dir=None, history_size=10, coalesce_delay=0.2):
+        self.history_dir = Path(history_dir) if history_dir is not None else None
+        self.history_size = history_size
+        self.coalesce_delay = coalesce_delay
+        self.writes = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._pending = {}            # path -> (data, indent); data None removes the file
+        self._busy = False
+        self._flushers = 0
+        self._stopping = False
+        self._last_submit = 0.0
+        self._submitted = 0           # tokens handed out by submit()
+        self._completed = 0           # every token up to this one has been processed
+        self._failures = deque(maxlen=32)  # (first, last) token ranges of batches with a failed write
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, path, data, indent=4):
+        """Queues `data` (None = delete the file) to be written to `path`; returns its token."""
+        path = Path(path)
+        with self._cond:
+            if path in self._pending:
+                self.coalesced += 1
+            self._pending[path] = (data, indent)
+            self._last_submit = time.monotonic()
+            self._submitted += 1
+            token = self._submitted
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="ConfigWriter", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return token
+
+    def status(self, token):
+        """None while the save of `token` is pending, True once written, False if the write failed."""
+        with self._cond:
+            if token > self._completed:
+                return None
+            return not any(first < token <= last for first, last in self._failures)
+
+    def flush(self, timeout=None):
+        """Writes everything queued now; returns False if `timeout` expired first."""
+        with self._cond:
+            self._flushers += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+            finally:
+                self._flushers -= 1
+
+    def stop(self, timeout=5.0):
+        """Flushes pending writes and stops the writer thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # 合併連續儲存：等到一段時間內沒有新的 submit（flush/stop 時立即寫）
+                while not self._stopping and not self._flushers:
+                    remaining = self._last_submit + self.coalesce_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, {}
+                batch_token = self._submitted  # 被合併取代的舊 token 也由這批寫入完成
+                self._busy = True
+            ok = all([self._write(path, data, indent) for path, (data, indent) in batch.items()])
+            with self._cond:
+                if not ok:
+                    self._failures.append((self._completed, batch_token))
+                self._completed = batch_token
+                self._busy = False
+                self._cond.notify_all()
+
+    def _write(self, path, data, indent):
+        try:
+            self._archive(path)
+            if data is None:
+                if path.exists():
+                    path.unlink()
+                    print(f"[ConfigWriter] Removed {path}")
+            else:
+                atomic_write_json(path, data, indent)
+                print(f"[ConfigWriter] Saved {path}")
+            self.writes += 1
+            return True
+        except Exception as e:
+            self.errors += 1
+            print(f"[ConfigWriter] Error writing {path}: {e}")
+            return False
+
+    def _archive(self, path):
+        """Copies the current content of `path` into the history directory."""
+        if self.history_dir is None or not path.exists():
+            return
+        self.history_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        shutil.copy2(path, self.history_dir / f"{path.stem}.{stamp}{path.suffix}")
+        for old in self.history(path)[self.history_size:]:
+            old.unlink()
+
+    def history(self, path):
+        """History files of `path`, newest first."""
+        path = Path(path)
+        if self.history_dir is None or not self.history_dir.exists():
+            return []
+        # 時間戳格式固定，字典序即時間序
+        return sorted(self.history_dir.glob(f"{path.stem}.*{path.suffix}"), reverse=True)
+
+    def rollback(self, path, steps=1, validate=None):
+        """
+        Restores the version `steps` saves back (1 = the one before the current
+        file) and returns its data, or None if the history is not that deep.
+        `validate(data)` may raise ValueError to refuse a corrupt entry; read
+        errors propagate (OSError/ValueError) and nothing is written then.
+        The current file is archived too, so a rollback can itself be undone.
+        """
+        self.flush()  # 尚未寫入的儲存也要先進歷史，步數才對得上
+        entries = self.history(path)
+        if steps < 1 or steps > len(entries):
+            return None
+        with open(entries[steps - 1], "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if validate is not None:
+            data = validate(data)
+        self.submit(path, data)
+        self.flush()
+        return data
+
+    def get_stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {"writes": self.writes, "coalesced": self.coalesced, "errors": self.errors, "pending": pending}
+
@@ -0,0 +1,49 @@
+# utils/vision_processing/contour_features.py
+
+from collections import namedtuple
+
+import cv2
+
+# Contours smaller than this can never pass validate_shape/compute_confidence
+MIN_CONTOUR_AREA = 1000
+
+# Everything the validator and the scorer need, computed once per contour.
+# box is the boundingRect of `approx`.
+ContourFeatures = namedtuple(
+    "ContourFeatures",
+    ["area", "perimeter", "approx", "box", "vertices", "aspect_ratio"],
+)
+
+
+def iter_contours(mask):
+    """Returns the outer contours of `mask` (RETR_EXTERNAL, as the detector has always used)."""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return contours
+
+
+def extract_features(cnt, min_area=MIN_CONTOUR_AREA):
+    """
+    Returns the ContourFeatures of a contour, or None if its area is below
+    `min_area` (rejected before the costlier arcLength/approxPolyDP).
+    """
+    area = cv2.contourArea(cnt)
+    if area < min_area:
+        return None
+    perimeter = cv2.arcLength(cnt, True)
+    approx = cv2.approxPolyDP(cnt, 0.04 * perimeter, True)
+    x, y, w, h = cv2.boundingRect(approx)
+    return ContourFeatures(
+        area=area,
+        perimeter=perimeter,
+        approx=approx,
+        box=(x, y, w, h),
+        vertices=len(approx),
+        aspect_ratio=w / h if h != 0 else 0,
+    )
+
+
+def density(box, mask):
+    """Share of the (x, y, w, h) box covered by mask pixels."""
+    x, y, w, h = box
+    # 只對通過形狀驗證的輪廓計算，框內 countNonZero 成本很低
+    return cv2.countNonZero(mask[y:y+h, x:x+w]) / (w * h + 1)
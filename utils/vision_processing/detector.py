@@ -2,79 +2,251 @@
 
 import cv2
 import numpy as np
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from . import config
 from .config import action_map, load_color_ranges 
 from .feature_validator import validate_shape 
 from .confidence_scorer import compute_confidence
+from .contour_features import iter_contours, extract_features
+from .segmenter import HSVLookupSegmenter
+from .roi_tracker import merge_rois
+from .compiled_config import CompiledColorConfig
 from utils.vision_processing.ui_basic import draw_chinese_text
 
 shape_ch_map = {"Square": "方形", "Triangle": "三角形"}
 color_ch_map = {"Red": "紅色", "Blue": "藍色", "Green": "綠色"}
 
-def detect_target(frame, color_ranges_to_use, show_debug_windows=False):
+# box is (x, y, w, h) in full-frame coordinates
+Detection = namedtuple("Detection", ["label", "color", "shape", "score", "box"])
+
+# Shared lookup-table segmenter; recompiled only when the color ranges change
+_segmenter = HSVLookupSegmenter()
+
+# Persistent pool for the per-color passes (None = run them serially); see set_color_threads
+_color_pool = None
+
+def remove_small_components(mask, min_area):
+    """Keeps only connected components of `mask` whose area is at least `min_area`."""
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    big = stats[1:, cv2.CC_STAT_AREA] >= min_area  # 0是背景
+    if big.all():
+        return mask  # 每個前景像素都屬於保留的區塊
+    if not big.any():
+        return np.zeros_like(mask)
+    # 以 stats 建立 label -> 0/255 對照表，一次 remap 整張 label 圖
+    keep = np.zeros(num_labels, dtype=np.uint8)
+    keep[1:][big] = 255
+    return np.take(keep, labels)
+
+# Last dict-based color config and its compiled form (for callers passing plain dicts)
+_dict_config_cache = (None, None)
+
+def as_compiled_config(color_ranges_to_use):
+    """Returns a CompiledColorConfig for a compiled config or a plain {color: [lower, upper]} dict."""
+    global _dict_config_cache
+    if isinstance(color_ranges_to_use, CompiledColorConfig):
+        return color_ranges_to_use
+    key = HSVLookupSegmenter._ranges_key(color_ranges_to_use)
+    cached_key, compiled = _dict_config_cache
+    if key != cached_key or compiled.min_component_area != config.min_component_area:
+        compiled = CompiledColorConfig(color_ranges_to_use, action_map, config.min_component_area)
+        _dict_config_cache = (key, compiled)
+    return compiled
+
+def _clean_mask(mask, kernel, min_area):
+    """Light open/close plus small-component removal on a raw color mask."""
+    # 只做一次小kernel膨脹/腐蝕，保持稜角
+    mask = cv2.dilate(mask, kernel, iterations=1)
+    mask = cv2.erode(mask, kernel, iterations=1)
+    # 連通元件分析，去除小雜點（保留大於min_area的區塊）
+    return remove_small_components(mask, min_area)
+
+def set_color_threads(threads):
+    """
+    Runs the per-color mask cleanup and shape analysis on a persistent pool of
+    `threads` threads (0/1 = serial). The OpenCV calls release the GIL, so the
+    colors of one frame are processed concurrently; results are merged in the
+    configured color order, identical to the serial path.
+    """
+    global _color_pool
+    if _color_pool is not None:
+        _color_pool.shutdown(wait=True)
+        _color_pool = None
+    if threads > 1:
+        _color_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="ColorWorker")
+
+def _color_pass(labels, idx, color_name, color_config, min_area, zone_mask, offset, find):
+    """Mask extraction, cleanup and (if `find`) shape analysis for one color."""
+    mask = _clean_mask(_segmenter.color_mask(labels, idx), color_config.kernel, min_area)
+    if zone_mask is not None:
+        mask = cv2.bitwise_and(mask, zone_mask)
+    found = _find_detections(mask, color_name, offset, color_config.action_map) if find else []
+    # 排序鍵：(顏色順序, 全畫面掃描順序)，供多個 ROI 合併時還原整張畫面的偵測順序
+    return mask, [((idx,) + scan_key, det) for scan_key, det in found]
+
+def _segment(frame, color_config, min_area=None, zone_mask=None, offset=(0, 0), find=False):
+    """
+    Returns ({color: cleaned mask}, [(order_key, detection)]) for a BGR frame
+    (or ROI crop). The HSV conversion and the shared color labelling run once;
+    the per-color passes run on the color pool when one is configured.
+    Detections are only searched when `find` is set; their boxes are shifted
+    by `offset`. They come in serial order (configured color order, then
+    findContours order); sorting by order_key reproduces that order across
+    several crops of one frame.
+    """
+    if min_area is None:
+        min_area = color_config.min_component_area
     # Convert frame to HSV and apply Gaussian Blur
     hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
     hsv = cv2.GaussianBlur(hsv, (3, 3), 0)  # 只對原圖輕微模糊，防雜訊
+    # 顏色多時共用的查表只做一次；顏色少時 label 直接回傳 hsv，各色再做 inRange
+    _segmenter.compile(color_config)
+    labels = _segmenter.label(hsv)
+    names = _segmenter.color_names
+    pass_args = [(labels, idx, name, color_config, min_area, zone_mask, offset, find) for idx, name in enumerate(names)]
+    if _color_pool is not None and len(names) > 1:
+        results = list(_color_pool.map(lambda args: _color_pass(*args), pass_args))
+    else:
+        results = [_color_pass(*args) for args in pass_args]
+    # map 保持輸入順序：依顏色設定順序合併，結果與序列模式完全相同
+    mask_dict = {name: mask for name, (mask, _) in zip(names, results)}
+    keyed = [item for _, found in results for item in found]
+    return mask_dict, keyed
 
-    result_frame = frame.copy()
-    mask_dict = {}
-    detected_labels = []
-    detected_labels_with_scores = []
-
-    for color_name, (lower, upper) in color_ranges_to_use.items():
-        lower_np = np.array(lower)
-        upper_np = np.array(upper)
-        mask = cv2.inRange(hsv, lower_np, upper_np)
-
-        # 只做一次小kernel膨脹/腐蝕，保持稜角
-        kernel = np.ones((2, 2), np.uint8)
-        mask = cv2.dilate(mask, kernel, iterations=1)
-        mask = cv2.erode(mask, kernel, iterations=1)
-
-        # 連通元件分析，去除小雜點（保留大於min_area的區塊）
-        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
-        min_area = 300  # 根據實際情況調整
-        cleaned_mask = np.zeros_like(mask)
-        for i in range(1, num_labels):  # 0是背景
-            if stats[i, cv2.CC_STAT_AREA] >= min_area:
-                cleaned_mask[labels == i] = 255
-        mask = cleaned_mask
-
-        mask_dict[color_name] = mask
-
-        if show_debug_windows:
-            cv2.imshow(f"{color_name} Mask", mask)
+def _find_detections(mask, color_name, offset=(0, 0), shape_action_map=action_map):
+    """
+    Shape analysis on one color mask; returns [(scan_key, Detection)] with boxes
+    shifted by `offset` into frame coordinates. scan_key sorts like the order
+    findContours reports outer contours in (descending start row, then column).
+    """
+    detections = []
+    for cnt in iter_contours(mask):
+        # 面積、周長、近似多邊形與外框只算一次，面積不足直接略過
+        features = extract_features(cnt)
+        if features is None:
+            continue
+        approx = features.approx
+        x, y, w, h = features.box
+
+        shape = None
+        if features.vertices == 3:
+            shape = "Triangle"
+        elif features.vertices == 4:
+            shape = "Square"
+
+        if shape and validate_shape(cnt, approx, shape, features):
+            score = compute_confidence(cnt, approx, mask, shape, features)
+            if score >= 0.7:
+                label = shape_action_map.get((color_name, shape), None)
+                if label:
+                    start_x, start_y = cnt[0][0]
+                    scan_key = (-(int(start_y) + offset[1]), -(int(start_x) + offset[0]))
+                    detections.append((scan_key, Detection(label, color_name, shape, score, (x + offset[0], y + offset[1], w, h))))
+    return detections
+
+def _annotate(result_frame, detections):
+    """Draws boxes and Chinese labels for the detections."""
+    for det in detections:
+        x, y, w, h = det.box
+        cv2.rectangle(result_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        ch_color = color_ch_map.get(det.color, det.color)
+        ch_shape = shape_ch_map.get(det.shape, det.shape)
+        label_text = f"{ch_color}-{ch_shape} ({det.score:.2f})"
+        # 用 PIL 畫中文字
+        result_frame = draw_chinese_text(
+            result_frame,
+            label_text,
+            (x, y - 10),
+            font_size=28,
+            color=(255,255,255),
+            font_path="chinese.ttf"
+        )
+    return result_frame
+
+def find_targets(frame, color_ranges_to_use, rois=None, zone_mask=None):
+    """
+    Runs segmentation and shape analysis and returns (detections, mask_dict).
+    With `rois` (a list of (x0, y0, x1, y1)), only those regions are processed;
+    the returned masks are still full-frame sized (zero outside the ROIs).
+    `zone_mask` (full-frame 0/255) blanks pixels outside a work-zone polygon.
+    """
+    color_config = as_compiled_config(color_ranges_to_use)
+    if rois is None:
+        mask_dict, keyed = _segment(frame, color_config, zone_mask=zone_mask, find=True)
+        return [det for _, det in keyed], mask_dict
 
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        for cnt in contours:
-            approx = cv2.approxPolyDP(cnt, 0.04 * cv2.arcLength(cnt, True), True)
-            x, y, w, h = cv2.boundingRect(approx)
-
-            shape = None
-            if len(approx) == 3:
-                shape = "Triangle"
-            elif len(approx) == 4:
-                shape = "Square"
-
-            if shape and validate_shape(cnt, approx, shape):
-                score = compute_confidence(cnt, approx, mask, shape)
-                if score >= 0.7:
-                    label = action_map.get((color_name, shape), None)
-                    if label:
-                        detected_labels.append(label)
-                        detected_labels_with_scores.append((label, score))
-                        cv2.rectangle(result_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                        ch_color = color_ch_map.get(color_name, color_name)
-                        ch_shape = shape_ch_map.get(shape, shape)
-                        label_text = f"{ch_color}-{ch_shape} ({score:.2f})"
-                        # 用 PIL 畫中文字
-                        result_frame = draw_chinese_text(
-                            result_frame,
-                            label_text,
-                            (x, y - 10),
-                            font_size=28,
-                            color=(255,255,255),
-                            font_path="chinese.ttf"
-                        )
+    frame_h, frame_w = frame.shape[:2]
+    mask_dict = {name: np.zeros((frame_h, frame_w), np.uint8) for name in color_config.names}
+    keyed = []
+    for x0, y0, x1, y1 in rois:
+        roi_zone = zone_mask[y0:y1, x0:x1] if zone_mask is not None else None
+        roi_masks, roi_keyed = _segment(frame[y0:y1, x0:x1], color_config, zone_mask=roi_zone, offset=(x0, y0), find=True)
+        for color_name, mask in roi_masks.items():
+            mask_dict[color_name][y0:y1, x0:x1] = mask
+        keyed.extend(roi_keyed)
+    # 依顏色順序與掃描位置合併，偵測順序（以及第一個觸發的動作）與全畫面掃描一致
+    keyed.sort(key=lambda item: item[0])
+    return [det for _, det in keyed], mask_dict
+
+def pyramid_candidates(frame, color_ranges_to_use, factor, region=None):
+    """
+    Coarse pass of the pyramid mode: segments `region` (x0, y0, x1, y1; default
+    the whole frame) downscaled by `factor` and returns padded full-resolution
+    boxes around the blobs found there, for find_targets to refine.
+    """
+    frame_h, frame_w = frame.shape[:2]
+    rx0, ry0, rx1, ry1 = region if region is not None else (0, 0, frame_w, frame_h)
+    crop = frame[ry0:ry1, rx0:rx1]
+    small_w, small_h = max(1, crop.shape[1] // factor), max(1, crop.shape[0] // factor)
+    small = cv2.resize(crop, (small_w, small_h), interpolation=cv2.INTER_AREA)
+    # 縮小後面積按比例縮小；邊框外擴數個粗像素，讓細化時能拿到完整輪廓
+    color_config = as_compiled_config(color_ranges_to_use)
+    small_masks, _ = _segment(small, color_config, min_area=color_config.min_component_area // (factor * factor))
+    pad = 3 * factor
+    boxes = []
+    for mask in small_masks.values():
+        num_labels, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        for x, y, w, h, _area in stats[1:]:
+            boxes.append((
+                int(max(rx0, rx0 + x * factor - pad)),
+                int(max(ry0, ry0 + y * factor - pad)),
+                int(min(rx1, rx0 + (x + w) * factor + pad)),
+                int(min(ry1, ry0 + (y + h) * factor + pad)),
+            ))
+    return merge_rois(boxes)
+
+def detect_target(frame, color_ranges_to_use, show_debug_windows=False, tracker=None, work_zone=None, pyramid=1):
+    """
+    Detects color/shape targets and returns
+    (annotated frame, labels, {color: mask}, [(label, score)]).
+    With a ROITracker only the predicted regions are scanned, apart from its
+    periodic full-frame rescans. With a WorkZone the frame is cropped to the
+    zone before any color conversion; boxes stay in full-frame coordinates.
+    With pyramid=2 or 4, full scans first segment a downscaled frame and only
+    refine the candidate blobs at full resolution.
+    """
+    color_config = as_compiled_config(color_ranges_to_use)  # dict 只在內容改變時重新編譯
+    rois = tracker.plan(frame.shape) if tracker is not None else None
+    full_scan = rois is None
+    zone_mask = None
+    if work_zone is not None:
+        frame_h, frame_w = frame.shape[:2]
+        rois = work_zone.clip(rois if rois is not None else [(0, 0, frame_w, frame_h)], frame_w, frame_h)
+        zone_mask = work_zone.mask(frame_w, frame_h)
+    if pyramid > 1 and full_scan:
+        # 全畫面（或工作區）掃描才走金字塔；追蹤 ROI 已經夠小
+        regions = rois if rois is not None else [None]
+        rois = [box for region in regions for box in pyramid_candidates(frame, color_config, pyramid, region)]
+    detections, mask_dict = find_targets(frame, color_config, rois, zone_mask)
+    if tracker is not None:
+        tracker.update(detections)
+
+    if show_debug_windows:
+        for color_name, mask in mask_dict.items():
+            cv2.imshow(f"{color_name} Mask", mask)
 
+    result_frame = _annotate(frame.copy(), detections)
+    detected_labels = [det.label for det in detections]
+    detected_labels_with_scores = [(det.label, det.score) for det in detections]
     return result_frame, detected_labels, mask_dict, detected_labels_with_scores  # 回傳 dict
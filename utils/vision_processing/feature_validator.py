@@ -1,13 +1,19 @@
 # utils/vision_processing/feature_validator.py
 
 import cv2
+from .contour_features import MIN_CONTOUR_AREA
 
-def validate_shape(cnt, approx, shape_name):
-    area = cv2.contourArea(cnt)
-    if area < 1000:
+def validate_shape(cnt, approx, shape_name, features=None):
+    # features: ContourFeatures from contour_features.extract_features (avoids recomputing)
+    if features is not None:
+        area = features.area
+        x, y, w, h = features.box
+    else:
+        area = cv2.contourArea(cnt)
+        x, y, w, h = cv2.boundingRect(approx)
+    if area < MIN_CONTOUR_AREA:
         return False
 
-    x, y, w, h = cv2.boundingRect(approx)
     aspect_ratio = w / h
 
     if shape_name == "Square":
@@ -0,0 +1,96 @@
+# utils/vision_processing/motion_gate.py
+
+from copy import deepcopy
+
+import cv2
+import numpy as np
+
+from utils.clock import system_clock
+from .compiled_config import CompiledColorConfig
+
+
+class MotionGate:
+    """
+    Cheap change detector in front of detect_target.
+
+    Each frame is shrunk to a small grayscale thumbnail and compared with the
+    thumbnail of the last *processed* frame. When the fraction of pixels that
+    changed by more than `pixel_delta` stays below `change_threshold`, the
+    previous detection result can be reused. A full detection is forced at
+    least every `refresh_interval` seconds and whenever the color ranges change.
+    """
+
+    def __init__(self, change_threshold=0.005, pixel_delta=18, refresh_interval=1.0,
+                 thumb_size=(80, 60), clock=None):
+        self.change_threshold = change_threshold
+        self.pixel_delta = pixel_delta
+        self.refresh_interval = refresh_interval
+        self.thumb_size = thumb_size
+        self.clock = clock or system_clock
+        self.frames_processed = 0
+        self.frames_skipped = 0
+        self.last_change = 0.0
+        self._reference = None       # thumbnail of the last processed frame
+        self._result = None          # detection result of that frame
+        self._ranges = None
+        self._processed_time = None
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def check(self, frame, color_ranges=None):
+        """
+        Returns (thumbnail, cached_result). cached_result is the previous
+        detection result when the frame can be skipped, otherwise None and the
+        caller should run detection and pass the result to `store()`.
+        """
+        thumb = self._thumbnail(frame)
+        if (
+            self._result is None
+            or self._reference is None
+            or self._reference.shape != thumb.shape
+            or self._ranges_changed(color_ranges)
+            or self.clock.time() - self._processed_time >= self.refresh_interval
+        ):
+            return thumb, None
+
+        diff = cv2.absdiff(thumb, self._reference)
+        self.last_change = float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+        if self.last_change >= self.change_threshold:
+            return thumb, None
+        self.frames_skipped += 1
+        # callers may draw on the returned frame, keep the cached one clean
+        return thumb, (self._result[0].copy(),) + tuple(self._result[1:])
+
+    def _ranges_changed(self, color_ranges):
+        if isinstance(color_ranges, CompiledColorConfig):
+            return color_ranges is not self._ranges  # 已編譯設定不可變，比對參考即可
+        return color_ranges != self._ranges
+
+    def store(self, thumb, result, color_ranges=None):
+        """Remembers the frame (thumbnail) and detection result just processed."""
+        self._reference = thumb
+        self._result = (result[0].copy(),) + tuple(result[1:])
+        if isinstance(color_ranges, CompiledColorConfig):
+            self._ranges = color_ranges
+        else:
+            self._ranges = deepcopy(color_ranges)
+        self._processed_time = self.clock.time()
+        self.frames_processed += 1
+
+    def invalidate(self):
+        """Forces a full detection on the next frame."""
+        self._result = None
+        self._reference = None
+
+    def get_stats(self):
+        total = self.frames_processed + self.frames_skipped
+        return {
+            "frames_processed": self.frames_processed,
+            "frames_skipped": self.frames_skipped,
+            "skip_ratio": self.frames_skipped / total if total else 0.0,
+            "last_change": self.last_change,
+        }
@@ -0,0 +1,230 @@
+# utils/vision_processing/parallel_pipeline.py
+
+import multiprocessing as mp
+import queue
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .compiled_config import CompiledColorConfig
+from .detector import detect_target
+from .work_zone import WorkZone
+
+
+def _worker_main(worker_id, shm_name, ring_shape, tasks, results):
+    """Detector process: runs detect_target on ring slots and writes the annotated frame back in place."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray(ring_shape, dtype=np.uint8, buffer=shm.buf)
+    zone_dict, zone = None, None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, color_ranges, task_zone, pyramid = task
+            if task_zone != zone_dict:
+                zone_dict = task_zone
+                zone = WorkZone.from_dict(zone_dict) if zone_dict else None
+            start = time.perf_counter()
+            try:
+                # 純 dict 設定由 detector 依內容快取編譯結果，版本不變時不會重新編譯
+                result_frame, labels, _mask, labels_with_scores = detect_target(
+                    ring[slot], color_ranges, work_zone=zone, pyramid=pyramid
+                )
+                ring[slot] = result_frame
+                error = None
+            except Exception as e:
+                labels, labels_with_scores, error = [], [], repr(e)
+            results.put((seq, slot, labels, labels_with_scores, time.perf_counter() - start, worker_id, error))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del ring
+        shm.close()
+
+
+class ParallelDetectionPipeline:
+    """
+    Frame-parallel detection over a pool of worker processes.
+
+    Frames are copied into a `multiprocessing.shared_memory` ring of `slots`
+    frame buffers; only (sequence, slot, config) tuples go through the task
+    queue, and workers write the annotated frame back into the same slot, so
+    no frame is ever pickled. Results arrive in any order and are released by
+    `collect()` strictly in submission order. `submit()` blocks while every
+    slot is in use (backpressure instead of unbounded queueing).
+
+    Detection here is stateless per frame: the motion gate and the ROI tracker
+    depend on the previous frame and are not used in this mode.
+    """
+
+    def __init__(self, frame_shape, workers=3, slots=None):
+        self.frame_shape = tuple(frame_shape)
+        self.workers = workers
+        self.slots = slots or workers * 2
+        self._ctx = mp.get_context("spawn")  # 不 fork 帶有執行緒的主程序
+        self._shm = None
+        self._ring = None
+        self._procs = []
+        self._tasks = None
+        self._results = None
+        self._free_slots = deque(range(self.slots))
+        self._next_seq = 0            # next sequence number to submit
+        self._next_release = 0        # next sequence number collect() may release
+        self._pending = {}            # seq -> (slot, labels, labels_with_scores, arrival time)
+        self._submit_times = {}
+        self._ready = deque()
+        self._config_key = None       # (compiled config object, its dict form)
+        self._zone_key = None         # (WorkZone object, its dict form)
+
+        self.frames_submitted = 0
+        self.frames_completed = 0
+        self.out_of_order = 0
+        self.errors = 0
+        self.ring_full_waits = 0
+        self._detect_time_total = 0.0
+        self._latency_total = 0.0
+        self._reorder_total = 0.0
+        self.max_reorder = 0.0
+        self._per_worker = [0] * workers
+        self._start_time = None
+
+    def start(self):
+        frame_bytes = int(np.prod(self.frame_shape))
+        self._shm = shared_memory.SharedMemory(create=True, size=frame_bytes * self.slots)
+        ring_shape = (self.slots,) + self.frame_shape
+        self._ring = np.ndarray(ring_shape, dtype=np.uint8, buffer=self._shm.buf)
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        for worker_id in range(self.workers):
+            proc = self._ctx.Process(
+                target=_worker_main,
+                args=(worker_id, self._shm.name, ring_shape, self._tasks, self._results),
+                name=f"DetectWorker-{worker_id}",
+                daemon=True,
+            )
+            proc.start()
+            self._procs.append(proc)
+        print(f"[Pipeline] Started {self.workers} detector processes, {self.slots} shared-memory slots "
+              f"of {self.frame_shape[1]}x{self.frame_shape[0]}.")
+        return self
+
+    def _task_config(self, color_config, work_zone):
+        """Picklable (dict) forms of the config and zone, converted once per object."""
+        if self._config_key is None or self._config_key[0] is not color_config:
+            ranges = color_config.to_dict() if isinstance(color_config, CompiledColorConfig) else dict(color_config)
+            self._config_key = (color_config, ranges)
+        if self._zone_key is None or self._zone_key[0] is not work_zone:
+            self._zone_key = (work_zone, work_zone.to_dict() if work_zone is not None else None)
+        return self._config_key[1], self._zone_key[1]
+
+    def submit(self, frame, color_config, work_zone=None, pyramid=1):
+        """Copies `frame` into a free slot and queues it; returns its sequence number."""
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match pipeline shape {self.frame_shape}")
+        if not self._free_slots:
+            self.ring_full_waits += 1
+            while not self._free_slots:
+                self._receive(block=True)
+        slot = self._free_slots.popleft()
+        self._ring[slot] = frame
+        seq = self._next_seq
+        self._next_seq += 1
+        now = time.perf_counter()
+        if self._start_time is None:
+            self._start_time = now
+        self._submit_times[seq] = now
+        color_ranges, zone_dict = self._task_config(color_config, work_zone)
+        self._tasks.put((seq, slot, color_ranges, zone_dict, pyramid))
+        self.frames_submitted += 1
+        return seq
+
+    def _receive(self, block):
+        """Takes one result off the result queue (if any) and releases what is now in order."""
+        try:
+            item = self._results.get(timeout=1.0) if block else self._results.get_nowait()
+        except queue.Empty:
+            if block and not all(proc.is_alive() for proc in self._procs):
+                raise RuntimeError("A detector worker process died.")
+            return False
+        seq, slot, labels, labels_with_scores, detect_time, worker_id, error = item
+        if seq != self._next_release:
+            self.out_of_order += 1
+        if error is not None:
+            self.errors += 1
+            print(f"[Pipeline] Worker {worker_id} failed on frame {seq}: {error}")
+        self._detect_time_total += detect_time
+        self._per_worker[worker_id] += 1
+        self._pending[seq] = (slot, labels, labels_with_scores, time.perf_counter())
+        self._release_in_order()
+        return True
+
+    def _release_in_order(self):
+        while self._next_release in self._pending:
+            seq = self._next_release
+            slot, labels, labels_with_scores, arrived = self._pending.pop(seq)
+            frame = self._ring[slot].copy()  # 之後這一格會被下一張影格覆寫
+            self._free_slots.append(slot)
+            now = time.perf_counter()
+            reorder = now - arrived
+            self._reorder_total += reorder
+            self.max_reorder = max(self.max_reorder, reorder)
+            self._latency_total += now - self._submit_times.pop(seq)
+            self.frames_completed += 1
+            self._next_release += 1
+            self._ready.append((seq, frame, labels, labels_with_scores))
+
+    def collect(self, wait=False):
+        """
+        Returns the finished (seq, result_frame, labels, labels_with_scores)
+        tuples in frame order. With wait=True blocks until every submitted
+        frame is done.
+        """
+        while self._receive(block=False):
+            pass
+        while wait and self._next_release < self._next_seq:
+            self._receive(block=True)
+        ready = list(self._ready)
+        self._ready.clear()
+        return ready
+
+    def stop(self):
+        if self._tasks is not None:
+            for _ in self._procs:
+                self._tasks.put(None)
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._procs = []
+        for q in (self._tasks, self._results):
+            if q is not None:
+                q.close()
+                q.join_thread()
+        self._tasks = self._results = None
+        if self._shm is not None:
+            self._ring = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def get_stats(self):
+        done = self.frames_completed
+        elapsed = time.perf_counter() - self._start_time if self._start_time else 0.0
+        return {
+            "workers": self.workers,
+            "slots": self.slots,
+            "frames_submitted": self.frames_submitted,
+            "frames_completed": done,
+            "throughput_fps": done / elapsed if elapsed > 0 else 0.0,
+            "mean_detect_ms": self._detect_time_total / done * 1000.0 if done else 0.0,
+            "mean_latency_ms": self._latency_total / done * 1000.0 if done else 0.0,
+            "mean_reorder_ms": self._reorder_total / done * 1000.0 if done else 0.0,
+            "max_reorder_ms": self.max_reorder * 1000.0,
+            "out_of_order": self.out_of_order,
+            "ring_full_waits": self.ring_full_waits,
+            "errors": self.errors,
+            "frames_per_worker": list(self._per_worker),
+        }
@@ -0,0 +1,92 @@
+# utils/vision_processing/resolution_governor.py
+
+from collections import deque
+
+
+class ResolutionGovernor:
+    """
+    Holds a target frame rate by trading detection resolution (the pyramid
+    factor) and, optionally, detection frame skipping for latency.
+
+    The governor walks a ladder of (scale, frame_skip) levels, cheapest last.
+    It steps down the ladder when the moving-window mean latency exceeds the
+    frame budget (1 / target_fps), and steps back up only when the mean falls
+    below `headroom` x budget and the latency predicted for the better level
+    (from the cost ratio measured when it was left) fits the budget. After
+    every change the window is cleared and at least `window` new samples are
+    needed before the next decision, so the level does not oscillate.
+    """
+
+    def __init__(self, target_fps, scales=(1, 2, 4), max_skip=0, window=30, headroom=0.5):
+        self.target_fps = target_fps
+        self.budget = 1.0 / target_fps
+        self.window = window
+        self.headroom = headroom
+        self.levels = [(scale, 0) for scale in scales]
+        self.levels += [(scales[-1], skip) for skip in range(1, max_skip + 1)]
+        self.level = 0
+        self.latencies = deque(maxlen=window)
+        self.level_changes = 0
+        self._frame_index = 0
+        self._step_ratio = {}        # level -> latency(level - 1) / latency(level)
+        self._pending_ratio = None   # (previous level, its mean) right after stepping down
+
+    @property
+    def scale(self):
+        return self.levels[self.level][0]
+
+    @property
+    def frame_skip(self):
+        return self.levels[self.level][1]
+
+    def should_process(self):
+        """True for the frames detection should run on (1 of every frame_skip + 1)."""
+        process = self._frame_index % (self.frame_skip + 1) == 0
+        self._frame_index += 1
+        return process
+
+    def mean_latency(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    def record(self, latency):
+        """Adds one end-to-end detection latency (seconds) and adapts the level if needed."""
+        # 跳幀時一次偵測的成本由 frame_skip + 1 張影格分攤
+        self.latencies.append(latency / (self.frame_skip + 1))
+        if len(self.latencies) < self.window:
+            return
+        mean = self.mean_latency()
+        if self._pending_ratio is not None:
+            prev_level, prev_mean = self._pending_ratio
+            if prev_level == self.level - 1 and mean > 0:
+                self._step_ratio[self.level] = prev_mean / mean
+            self._pending_ratio = None
+
+        if mean > self.budget and self.level < len(self.levels) - 1:
+            self._pending_ratio = (self.level, mean)
+            self._set_level(self.level + 1, mean)
+        elif mean < self.headroom * self.budget and self.level > 0:
+            ratio = self._step_ratio.get(self.level)
+            if ratio is None or mean * ratio < self.budget:
+                self._set_level(self.level - 1, mean)
+
+    def _set_level(self, level, mean):
+        old_scale, old_skip = self.levels[self.level]
+        self.level = level
+        self.level_changes += 1
+        self.latencies.clear()
+        self._frame_index = 0
+        print(
+            f"[Governor] scale 1/{old_scale} skip {old_skip} -> scale 1/{self.scale} skip {self.frame_skip} "
+            f"(mean {mean * 1000:.1f} ms, budget {self.budget * 1000:.1f} ms)"
+        )
+
+    def get_stats(self):
+        mean = self.mean_latency()
+        return {
+            "target_fps": self.target_fps,
+            "scale": self.scale,
+            "frame_skip": self.frame_skip,
+            "mean_latency_ms": mean * 1000.0,
+            "detection_fps": 1.0 / mean if mean else 0.0,
+            "level_changes": self.level_changes,
+        }
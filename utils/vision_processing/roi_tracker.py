@@ -0,0 +1,145 @@
+# utils/vision_processing/roi_tracker.py
+
+
+def merge_rois(rois):
+    """Merges overlapping (x0, y0, x1, y1) boxes so no pixel is processed twice."""
+    rois = list(rois)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rois)):
+            for j in range(i + 1, len(rois)):
+                a, b = rois[i], rois[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rois[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rois[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rois
+
+
+def _center(box):
+    x, y, w, h = box
+    return x + w / 2.0, y + h / 2.0
+
+
+class ROITracker:
+    """
+    Predicts where the current detections will be in the next frame so that
+    detect_target only scans padded regions around them.
+
+    Each track keeps its last box and a constant-velocity estimate. A full
+    frame scan is done when there is nothing to track, every
+    `full_scan_interval` frames (to pick up new objects), and on the frame
+    after a track was lost or a detection touched its ROI border.
+    """
+
+    def __init__(self, full_scan_interval=15, padding=0.5, min_padding=24, match_distance=1.0):
+        self.full_scan_interval = full_scan_interval
+        self.padding = padding              # ROI margin as a fraction of the box size
+        self.min_padding = min_padding      # minimum ROI margin in pixels
+        self.match_distance = match_distance  # max center shift, in box sizes, to keep a track
+        self.tracks = []                    # [{"label", "box", "velocity"}]
+        self.current_rois = None            # ROIs of the frame being processed (None = full scan)
+        self._frame_size = None
+        self._force_full_scan = True
+        self._frames_since_full_scan = 0
+        self.full_scans = 0
+        self.roi_scans = 0
+        self.tracks_lost = 0
+        self.pixels_scanned = 0
+        self.pixels_total = 0
+
+    def reset(self):
+        """Drops all tracks; the next frame gets a full scan."""
+        self.tracks = []
+        self.current_rois = None
+        self._force_full_scan = True
+
+    def plan(self, frame_shape):
+        """Returns the ROIs to scan for the next frame, or None for a full-frame scan."""
+        frame_h, frame_w = frame_shape[:2]
+        self._frame_size = (frame_w, frame_h)
+        self.pixels_total += frame_w * frame_h
+        if (
+            not self.tracks
+            or self._force_full_scan
+            or self._frames_since_full_scan + 1 >= self.full_scan_interval
+        ):
+            self.current_rois = None
+            self._frames_since_full_scan = 0
+            self.full_scans += 1
+            self.pixels_scanned += frame_w * frame_h
+            return None
+
+        rois = []
+        for track in self.tracks:
+            x, y, w, h = track["box"]
+            vx, vy = track["velocity"]
+            pad_x = max(self.min_padding, self.padding * w) + abs(vx)
+            pad_y = max(self.min_padding, self.padding * h) + abs(vy)
+            rois.append((
+                int(max(0, x + vx - pad_x)),
+                int(max(0, y + vy - pad_y)),
+                int(min(frame_w, x + vx + w + pad_x)),
+                int(min(frame_h, y + vy + h + pad_y)),
+            ))
+        rois = [roi for roi in merge_rois(rois) if roi[2] > roi[0] and roi[3] > roi[1]]
+        self.current_rois = rois
+        self._frames_since_full_scan += 1
+        self.roi_scans += 1
+        self.pixels_scanned += sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rois)
+        return rois
+
+    def _touches_roi_border(self, box):
+        # 目標貼齊 ROI 邊界（且不是畫面邊界）時可能被截斷，下一張改做全畫面掃描
+        x, y, w, h = box
+        frame_w, frame_h = self._frame_size
+        for x0, y0, x1, y1 in self.current_rois:
+            if x0 <= x and y0 <= y and x + w <= x1 and y + h <= y1:
+                return (
+                    (x <= x0 and x0 > 0) or (y <= y0 and y0 > 0)
+                    or (x + w >= x1 and x1 < frame_w) or (y + h >= y1 and y1 < frame_h)
+                )
+        return True
+
+    def update(self, detections):
+        """Associates the new detections (with a `.label` and `.box`) to the tracks."""
+        unmatched = list(self.tracks)
+        new_tracks = []
+        for det in detections:
+            cx, cy = _center(det.box)
+            best, best_dist = None, None
+            for track in unmatched:
+                if track["label"] != det.label:
+                    continue
+                tx, ty = _center(track["box"])
+                dist = ((cx - tx) ** 2 + (cy - ty) ** 2) ** 0.5
+                limit = self.match_distance * max(track["box"][2], track["box"][3])
+                if dist <= limit and (best is None or dist < best_dist):
+                    best, best_dist = track, dist
+            velocity = (0.0, 0.0)
+            if best is not None:
+                unmatched.remove(best)
+                tx, ty = _center(best["box"])
+                velocity = (cx - tx, cy - ty)
+            new_tracks.append({"label": det.label, "box": det.box, "velocity": velocity})
+
+        lost = False
+        if self.current_rois is not None:
+            # ROI 掃描中追蹤目標消失，或目標可能被 ROI 截斷 -> 下一張全畫面重掃
+            lost = bool(unmatched) or any(self._touches_roi_border(det.box) for det in detections)
+            self.tracks_lost += len(unmatched)
+        self._force_full_scan = lost
+        self.tracks = new_tracks
+
+    def get_stats(self):
+        return {
+            "full_scans": self.full_scans,
+            "roi_scans": self.roi_scans,
+            "tracks": len(self.tracks),
+            "tracks_lost": self.tracks_lost,
+            "pixel_fraction": self.pixels_scanned / self.pixels_total if self.pixels_total else 1.0,
+        }
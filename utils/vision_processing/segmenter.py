@@ -0,0 +1,125 @@
+# utils/vision_processing/segmenter.py
+
+import cv2
+import numpy as np
+
+HUE_BINS = 180  # OpenCV 8-bit HSV hue range is 0..179
+COLORS_PER_PLANE = 8  # one bit per color in a uint8 label plane
+# Below this many colors one cv2.inRange per color is cheaper than the shared
+# split + 3 LUTs + ANDs (see benchmarks/hsv_segment.py)
+LUT_MIN_COLORS = 4
+
+
+def _channel_bits(lower, upper, bit, wrap_size=None):
+    """
+    Builds a 256-entry table with `bit` set for every channel value inside [lower, upper].
+    With `wrap_size` (the hue range), values >= wrap_size are treated as
+    wrap_size - 1 and a range with lower > upper wraps around
+    (e.g. hue 170..10 covers 170..179 and 0..10).
+    """
+    values = np.arange(256)
+    lower, upper = int(lower), int(upper)
+    if wrap_size is not None:
+        values = np.minimum(values, wrap_size - 1)
+    if wrap_size is not None and lower > upper:
+        inside = (values >= lower) | (values <= upper)
+    else:
+        inside = (values >= lower) & (values <= upper)
+    return np.where(inside, bit, 0).astype(np.uint8)
+
+
+class HSVLookupSegmenter:
+    """
+    Per-color HSV masks with the shared work done once per frame.
+
+    A color matches when H, S and V each fall inside its range, so the test is
+    separable per channel. From LUT_MIN_COLORS colors on, each channel gets a
+    256-entry table with one bit per color (8 colors per uint8 plane); `label`
+    applies them with cv2.LUT and ANDs the three channels once, and
+    `color_mask` only extracts a bit. With fewer colors `label` passes the HSV
+    frame through and `color_mask` is a plain cv2.inRange, which is cheaper
+    there. Both paths give identical masks; the tables are compiled from the
+    color ranges (a dict or a CompiledColorConfig) and only rebuilt when those
+    ranges change.
+    """
+
+    def __init__(self, color_ranges=None):
+        self._key = None
+        self._source = None  # last CompiledColorConfig seen (immutable, so identity is enough)
+        self.color_names = []
+        self.luts = []       # per label plane: (hue, sat, val) 256-entry uint8 tables
+        self.bounds = []     # per color: (lower, upper) uint8 arrays for the inRange path
+        self.use_lut = False
+        if color_ranges is not None:
+            self.compile(color_ranges)
+
+    @staticmethod
+    def _ranges_key(color_ranges):
+        return tuple(
+            (name, tuple(int(v) for v in lower), tuple(int(v) for v in upper))
+            for name, (lower, upper) in color_ranges.items()
+        )
+
+    def compile(self, color_ranges):
+        """(Re)builds the lookup tables if `color_ranges` differ from the compiled ones."""
+        if color_ranges is self._source:
+            return False
+        ranges_key = getattr(color_ranges, "ranges_key", None)
+        self._source = color_ranges if ranges_key is not None else None
+        key = ranges_key if ranges_key is not None else self._ranges_key(color_ranges)
+        if key == self._key:
+            return False
+
+        luts = []
+        for start in range(0, len(key), COLORS_PER_PLANE):
+            tables = [np.zeros(256, dtype=np.uint8) for _ in range(3)]
+            for offset, (name, lower, upper) in enumerate(key[start:start + COLORS_PER_PLANE]):
+                bit = 1 << offset
+                tables[0] |= _channel_bits(lower[0], upper[0], bit, wrap_size=HUE_BINS)
+                tables[1] |= _channel_bits(lower[1], upper[1], bit)
+                tables[2] |= _channel_bits(lower[2], upper[2], bit)
+            luts.append(tables)
+
+        self.luts = luts
+        self.bounds = [
+            (np.clip(lower, 0, 255).astype(np.uint8), np.clip(upper, 0, 255).astype(np.uint8))
+            for _, lower, upper in key
+        ]
+        # inRange 無法表示環繞的色相範圍，此時一律走查表
+        wraps = any(lower[0] > upper[0] for _, lower, upper in key)
+        self.use_lut = len(key) >= LUT_MIN_COLORS or wraps
+        self.color_names = [name for name, _, _ in key]
+        self._key = key
+        return True
+
+    def label(self, hsv):
+        """
+        Returns what `color_mask` needs for an HSV frame: the color bit-label
+        planes (uint8, 8 colors each) on the lookup path, else the frame itself.
+        """
+        if not self.use_lut:
+            return hsv
+        h, s, v = cv2.split(hsv)
+        planes = []
+        for hue_lut, sat_lut, val_lut in self.luts:
+            bits = cv2.bitwise_and(cv2.LUT(h, hue_lut), cv2.LUT(s, sat_lut))
+            planes.append(cv2.bitwise_and(bits, cv2.LUT(v, val_lut)))
+        return planes
+
+    def color_mask(self, labels, idx):
+        """Returns the uint8 0/255 mask of color number `idx` from the output of `label`."""
+        if not self.use_lut:
+            lower, upper = self.bounds[idx]
+            return cv2.inRange(labels, lower, upper)
+        plane = labels[idx // COLORS_PER_PLANE]
+        bit = 1 << (idx % COLORS_PER_PLANE)
+        return cv2.compare(cv2.bitwise_and(plane, bit), 0, cv2.CMP_NE)
+
+    def masks_from_labels(self, labels):
+        """Splits the label planes into {color_name: uint8 0/255 mask}."""
+        return {name: self.color_mask(labels, idx) for idx, name in enumerate(self.color_names)}
+
+    def segment(self, hsv, color_ranges):
+        """Compiles `color_ranges` if needed and returns per-color masks for `hsv`."""
+        self.compile(color_ranges)
+        return self.masks_from_labels(self.label(hsv))
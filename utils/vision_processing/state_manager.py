@@ -1,14 +1,15 @@
 # utils/vision_processing/state_manager.py
 
 from collections import deque, Counter
-import time
+from utils.clock import system_clock
 
 class StateManager:
-    def __init__(self, buffer_size=5, stable_threshold=3):
+    def __init__(self, buffer_size=5, stable_threshold=3, clock=None):
         self.buffer = deque(maxlen=buffer_size)
         self.stable_threshold = stable_threshold
         self.last_sent_label = None
         self.action_cooldowns = {}  # Track cooldowns for actions
+        self.clock = clock or system_clock  # utils.clock time source (SimulatedClock in tests)
 
     def update(self, new_label):
         self.buffer.append(new_label)
@@ -30,7 +31,7 @@ class StateManager:
         return None
 
     def can_perform_action(self, action_name, cooldown_seconds):
-        current_time = time.time()
+        current_time = self.clock.time()
         last_time = self.action_cooldowns.get(action_name, 0)
 
         if current_time - last_time >= cooldown_seconds:
@@ -44,5 +45,9 @@ class StateManager:
 
     def reset_action_cooldown(self, action_name):
         """Forcefully reset the cooldown for a specific action."""
-        self.action_cooldowns[action_name] = time.time()
+        self.action_cooldowns[action_name] = self.clock.time()
         print(f"[StateManager] Cooldown for action '{action_name}' has been reset.")
+
+    def clear_action_cooldown(self, action_name):
+        """Cancels the cooldown started by can_perform_action (the action was not carried out)."""
+        self.action_cooldowns.pop(action_name, None)
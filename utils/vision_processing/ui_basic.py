@@ -2,6 +2,7 @@
 
 import cv2
 import numpy as np
+from functools import lru_cache
 from PIL import ImageFont, ImageDraw, Image
 
 class AppUI:
@@ -36,9 +37,47 @@ class AppUI:
             cv2.destroyWindow(self.window_name)
             print(f"[AppUI] Window '{self.window_name}' destroyed.")
 
+@lru_cache(maxsize=32)
+def get_font(font_path="chinese.ttf", font_size=32):
+    """Returns the TrueType font for (path, size), loading it from disk only once."""
+    return ImageFont.truetype(font_path, font_size)
+
+@lru_cache(maxsize=512)
+def _get_text_sprite(text, font_size, color, font_path):
+    """
+    Rasterises `text` once and returns (dx, dy, alpha, ink).
+    (dx, dy) is the sprite offset from the draw position, `alpha` the HxWx1
+    coverage in [0, 1] and `ink` the premultiplied HxWx3 color layer.
+    """
+    font = get_font(font_path, font_size)
+    left, top, right, bottom = ImageDraw.Draw(Image.new("L", (1, 1))).textbbox((0, 0), text, font=font)
+    w, h = max(right - left, 1), max(bottom - top, 1)
+    mask = Image.new("L", (w, h), 0)
+    ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255)
+    alpha = np.asarray(mask, dtype=np.float32)[..., None] / 255.0
+    # PIL 以 RGB 解讀 BGR 陣列，原本傳入 (color[2], color[1], color[0])，此處保持相同通道順序
+    ink = alpha * np.array((color[2], color[1], color[0]), dtype=np.float32)
+    return left, top, alpha, ink
+
 def draw_chinese_text(img, text, pos, font_size=32, color=(0,0,0), font_path="chinese.ttf"):
-    img_pil = Image.fromarray(img)
-    draw = ImageDraw.Draw(img_pil)
-    font = ImageFont.truetype(font_path, font_size)
-    draw.text(pos, text, font=font, fill=(color[2], color[1], color[0]))
-    return np.array(img_pil)
\ No newline at end of file
+    """Draws `text` onto a BGR image in place (cached sprite blend) and returns the image."""
+    if img.ndim != 3 or img.shape[2] != 3:
+        img_pil = Image.fromarray(img)
+        draw = ImageDraw.Draw(img_pil)
+        draw.text(pos, text, font=get_font(font_path, font_size), fill=(color[2], color[1], color[0]))
+        return np.array(img_pil)
+
+    dx, dy, alpha, ink = _get_text_sprite(text, font_size, tuple(color), font_path)
+    x0, y0 = int(pos[0]) + dx, int(pos[1]) + dy
+    h, w = alpha.shape[:2]
+    # 裁切到影像範圍內，只混合文字所在的 ROI
+    sx0, sy0 = max(0, -x0), max(0, -y0)
+    sx1, sy1 = min(w, img.shape[1] - x0), min(h, img.shape[0] - y0)
+    if sx1 <= sx0 or sy1 <= sy0:
+        return img
+    roi = img[y0 + sy0:y0 + sy1, x0 + sx0:x0 + sx1]
+    a = alpha[sy0:sy1, sx0:sx1]
+    blended = roi * (1.0 - a) + ink[sy0:sy1, sx0:sx1]
+    np.rint(blended, out=blended)
+    roi[:] = blended.astype(np.uint8)
+    return img
@@ -0,0 +1,90 @@
+# utils/vision_processing/vote_engine.py
+
+import math
+from collections import Counter, namedtuple
+
+from utils.clock import system_clock
+
+# label is None when the window expired without any vote;
+# reason is "margin", "evidence" or "timeout"
+VoteDecision = namedtuple("VoteDecision", ["label", "reason", "votes", "elapsed"])
+
+
+class SequentialVoter:
+    """
+    Collects per-frame (label, score) detections during a recognition window
+    and decides as soon as the evidence is conclusive instead of waiting for
+    the whole window.
+
+    Votes follow the original counting rule: each frame's best label gets +1
+    and every other label seen in that frame loses one vote (never below 0).
+    A decision is made when
+      - margin: the leading label is ahead of the runner-up by `margin` votes, or
+      - evidence: the leading label's accumulated log-likelihood ratio
+        sum(log(s / (1 - s))) over its frame scores reaches `evidence_threshold`
+        (a sequential probability ratio test; None disables it), or
+      - timeout: `max_window` seconds passed; the most voted label wins (if any).
+    """
+
+    def __init__(self, margin=5, evidence_threshold=None, max_window=3.0, clock=None):
+        self.margin = margin
+        self.evidence_threshold = evidence_threshold
+        self.max_window = max_window
+        self.clock = clock or system_clock
+        self.counter = Counter()
+        self.evidence = Counter()
+        self.window_start_time = None
+
+    @property
+    def active(self):
+        return self.window_start_time is not None
+
+    def start(self):
+        """Opens a new recognition window."""
+        self.counter.clear()
+        self.evidence.clear()
+        self.window_start_time = self.clock.time()
+
+    def reset(self):
+        """Closes the window and discards all votes."""
+        self.counter.clear()
+        self.evidence.clear()
+        self.window_start_time = None
+
+    def add(self, labels_with_scores):
+        """Adds one frame's detections, a list of (label, score)."""
+        if not labels_with_scores:
+            return
+        top_label, top_score = max(labels_with_scores, key=lambda x: x[1])
+        self.counter[top_label] += 1
+        clipped = min(max(top_score, 0.5), 0.999)  # a score of 0.5 carries no evidence
+        llr = math.log(clipped / (1.0 - clipped))
+        self.evidence[top_label] += llr
+        for label, score in labels_with_scores:
+            if label != top_label:
+                if self.counter[label] > 0:
+                    self.counter[label] -= 1
+                self.evidence[label] = max(0.0, self.evidence[label] - llr)
+
+    def decide(self):
+        """Returns a VoteDecision once a criterion is met (and closes the window), else None."""
+        if not self.active:
+            return None
+        elapsed = self.clock.time() - self.window_start_time
+        ranked = self.counter.most_common(2)
+        decision = None
+        if ranked:
+            leader, votes = ranked[0]
+            runner_up = ranked[1][1] if len(ranked) > 1 else 0
+            if self.margin is not None and votes > 0 and votes - runner_up >= self.margin:
+                decision = VoteDecision(leader, "margin", votes, elapsed)
+            elif self.evidence_threshold is not None and self.evidence[leader] >= self.evidence_threshold:
+                decision = VoteDecision(leader, "evidence", votes, elapsed)
+        if decision is None and elapsed >= self.max_window:
+            if ranked and ranked[0][1] > 0:
+                decision = VoteDecision(ranked[0][0], "timeout", ranked[0][1], elapsed)
+            else:
+                decision = VoteDecision(None, "timeout", 0, elapsed)
+        if decision is not None:
+            self.window_start_time = None
+        return decision
@@ -0,0 +1,71 @@
+# utils/vision_processing/work_zone.py
+
+import cv2
+import numpy as np
+
+
+def _clamp01(value):
+    return min(1.0, max(0.0, float(value)))
+
+
+class WorkZone:
+    """
+    Static processing region of the camera view.
+
+    Stored in normalized (0..1) frame coordinates so it survives resolution or
+    camera changes. `rect` is [x0, y0, x1, y1]; an optional `polygon`
+    ([[x, y], ...]) further restricts detection inside that rectangle.
+    """
+
+    def __init__(self, rect=(0.0, 0.0, 1.0, 1.0), polygon=None):
+        x0, y0, x1, y1 = (_clamp01(v) for v in rect)
+        self.rect = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        self.polygon = [(_clamp01(x), _clamp01(y)) for x, y in polygon] if polygon else None
+        self._mask_cache = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(rect=data.get("rect", (0.0, 0.0, 1.0, 1.0)), polygon=data.get("polygon"))
+
+    def to_dict(self):
+        return {
+            "rect": [round(v, 4) for v in self.rect],
+            "polygon": [[round(x, 4), round(y, 4)] for x, y in self.polygon] if self.polygon else None,
+        }
+
+    def box(self, frame_w, frame_h):
+        """Pixel crop box (x0, y0, x1, y1) of the zone for a frame size."""
+        x0, y0, x1, y1 = self.rect
+        if self.polygon:
+            xs = [x for x, _ in self.polygon]
+            ys = [y for _, y in self.polygon]
+            x0, y0 = max(x0, min(xs)), max(y0, min(ys))
+            x1, y1 = min(x1, max(xs)), min(y1, max(ys))
+        return (
+            int(x0 * frame_w), int(y0 * frame_h),
+            max(int(x0 * frame_w), int(round(x1 * frame_w))),
+            max(int(y0 * frame_h), int(round(y1 * frame_h))),
+        )
+
+    def mask(self, frame_w, frame_h):
+        """Full-frame 0/255 polygon mask, or None for a plain rectangle zone."""
+        if not self.polygon:
+            return None
+        key = (frame_w, frame_h)
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            points = np.array([[x * frame_w, y * frame_h] for x, y in self.polygon], dtype=np.int32)
+            mask = np.zeros((frame_h, frame_w), np.uint8)
+            cv2.fillPoly(mask, [points], 255)
+            self._mask_cache[key] = mask
+        return mask
+
+    def clip(self, rois, frame_w, frame_h):
+        """Intersects (x0, y0, x1, y1) ROIs with the zone box, dropping empty ones."""
+        zx0, zy0, zx1, zy1 = self.box(frame_w, frame_h)
+        clipped = []
+        for x0, y0, x1, y1 in rois:
+            x0, y0, x1, y1 = max(x0, zx0), max(y0, zy0), min(x1, zx1), min(y1, zy1)
+            if x1 > x0 and y1 > y0:
+                clipped.append((x0, y0, x1, y1))
+        return clipped